@@ -0,0 +1,131 @@
+import re
+import ast
+import json
+import hashlib
+import os
+from pathlib import Path
+from time import time
+from typing import Optional, Sequence
+from learn_python.utils import ROOT_DIR, lp_logger
+
+
+CACHE_FILE = ROOT_DIR / '.tutor_cache.json'
+
+# bump this if the structure of the cache file changes
+CACHE_VERSION = 1
+
+# responses older than this many seconds are not reused
+TTL = 7 * 24 * 60 * 60
+
+# the least recently used responses are evicted beyond this many
+MAX_ENTRIES = 256
+
+CODE_RGX = re.compile(r'```python\n(?P<code>.*?)```', re.DOTALL)
+
+
+def code_fingerprint(code: str) -> str:
+    """
+    Reduce code to its syntax tree, so that differences in formatting and comments
+    do not matter. Code that does not parse is only stripped of its whitespace.
+    """
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return ' '.join(code.split())
+
+
+def context_fingerprint(*parts: str, messages: Sequence[dict] = ()) -> str:
+    """
+    Hash the context a tutor response was generated for: the given parts, like
+    the backend and its directive, and the roles and contents of the messages. The
+    code blocks in the messages are fingerprinted by their syntax trees and all
+    other whitespace is collapsed.
+
+    :return: A hex digest string
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b'\0')
+    for msg in messages:
+        content = CODE_RGX.sub(
+            lambda mtch: code_fingerprint(mtch.group('code')),
+            msg['content'] or ''
+        )
+        digest.update(f'{msg["role"]}:{" ".join(content.split())}'.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    A persistent, on-disk cache of tutor responses keyed by the fingerprints of the
+    contexts they were generated for. See context_fingerprint(). Responses expire
+    after a time to live and the least recently used are evicted once the cache is
+    full.
+
+    :param path: The json file to persist the cache to
+    :param ttl: The number of seconds a response may be reused for
+    :param max_entries: The most responses to keep
+    """
+
+    path: Path
+    ttl: float = TTL
+    max_entries: int = MAX_ENTRIES
+
+    # key -> {'response': ..., 'stored': timestamp, 'used': timestamp}
+    responses: dict
+
+    def __init__(self, path: Path = CACHE_FILE, ttl=ttl, max_entries=max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.responses = {}
+        try:
+            if self.path.is_file():
+                cached = json.loads(self.path.read_text())
+                if cached.get('version', None) == CACHE_VERSION:
+                    self.responses = cached.get('responses', {})
+        except Exception:
+            lp_logger.exception('Unable to read tutor cache %s', self.path)
+        self.expire()
+
+    def expire(self):
+        """Drop the expired responses, then the least recently used beyond the limit."""
+        oldest = time() - self.ttl
+        for key in [key for key, entry in self.responses.items() if entry['stored'] < oldest]:
+            del self.responses[key]
+        if len(self.responses) > self.max_entries:
+            by_use = sorted(self.responses, key=lambda key: self.responses[key]['used'])
+            for key in by_use[:len(self.responses) - self.max_entries]:
+                del self.responses[key]
+
+    def get(self, key: str):
+        """
+        :return: The response cached under the key, or None if there is none or it
+            has expired
+        """
+        entry = self.responses.get(key, None)
+        if entry is None:
+            return None
+        if entry['stored'] < time() - self.ttl:
+            del self.responses[key]
+            return None
+        entry['used'] = time()
+        return entry['response']
+
+    def put(self, key: str, response):
+        """Cache the response, which must be json serializable, under the key."""
+        self.responses[key] = {'response': response, 'stored': time(), 'used': time()}
+        self.expire()
+
+    def save(self):
+        """Write the cache to disk."""
+        try:
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(
+                json.dumps({'version': CACHE_VERSION, 'responses': self.responses})
+            )
+            os.replace(tmp, self.path)
+        except Exception:
+            lp_logger.exception('Unable to write tutor cache %s', self.path)
@@ -0,0 +1,170 @@
+import json
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # token counts are estimated from the lengths of the texts
+    tiktoken = None
+
+
+# about this many characters make up a token of english text, for when tiktoken
+# is not installed
+CHARS_PER_TOKEN = 4
+
+# the tokens each message costs on top of its content, and the tokens that prime
+# the response - see https://github.com/openai/openai-cookbook
+MESSAGE_TOKENS = 4
+PRIMING_TOKENS = 3
+
+# tokens kept free in the context window for the response
+RESPONSE_TOKENS = 1024
+
+# this many of the most recent messages are never summarized
+KEEP_RECENT = 6
+
+
+class ContextWindow:
+    """
+    Fits the messages of a tutor session into the context window of the smallest
+    model they fit. Each model has a budget - its context window less the tokens
+    kept free for the response. The directive, the function descriptions and the
+    pinned messages are always sent in full. When the rest of the conversation
+    overflows the budget of the smallest model, all but the most recent of its
+    messages are folded into a running summary, or evicted if they cannot be
+    summarized. Only if that is not enough is a larger model used.
+
+    The messages themselves are never changed, the context window only keeps track
+    of how many of them the summary covers.
+
+    Usage::
+
+        context = ContextWindow({'gpt-4': 8192, 'gpt-4-32k': 32768}, summarize)
+        model, messages = await context.fit(directive, messages, functions)
+
+    :param windows: The number of tokens in the context window of each model,
+        smallest first
+    :param summarize: An async function that takes the current summary, which may
+        be empty, and the messages to fold into it and returns the new summary
+    :param reserve: The tokens to keep free for the response
+    :param keep: The number of most recent messages that are never summarized
+    """
+
+    windows: Dict[str, int]
+    summarize: Optional[Callable[[str, List[dict]], Awaitable[str]]] = None
+    reserve: int = RESPONSE_TOKENS
+    keep: int = KEEP_RECENT
+
+    # the summary of the oldest unpinned messages
+    summary: str = ''
+
+    # the number of unpinned messages the summary covers, or that were evicted
+    summarized: int = 0
+
+    # text -> tokens
+    counts: Dict[str, int]
+
+    _encoding = None
+
+    def __init__(self, windows, summarize=summarize, reserve=reserve, keep=keep):
+        self.windows = dict(windows)
+        self.summarize = summarize
+        self.reserve = reserve
+        self.keep = keep
+        self.counts = {}
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(next(iter(self.windows)))
+            except KeyError:
+                self._encoding = tiktoken.get_encoding('cl100k_base')
+
+    def reset(self):
+        """Forget the summary, for a new session."""
+        self.summary = ''
+        self.summarized = 0
+
+    def budget(self, model: str) -> int:
+        return self.windows[model] - self.reserve
+
+    def count(self, text: str) -> int:
+        """The number of tokens in the text, estimated if tiktoken is not installed."""
+        if text not in self.counts:
+            self.counts[text] = (
+                len(self._encoding.encode(text)) if self._encoding
+                else -(-len(text) // CHARS_PER_TOKEN)
+            )
+        return self.counts[text]
+
+    def tokens(self, messages: Sequence[dict]) -> int:
+        """The number of tokens the messages take up in a request."""
+        return sum(
+            MESSAGE_TOKENS + self.count(msg['role']) + self.count(msg['content'] or '')
+            for msg in messages
+        )
+
+    def summary_message(self) -> List[dict]:
+        if not self.summary:
+            return []
+        return [{
+            'role': 'system',
+            'content': f'A summary of the conversation so far: {self.summary}'
+        }]
+
+    async def fit(
+        self,
+        directive: str,
+        messages: Sequence[dict],
+        functions: Optional[list] = None
+    ) -> Tuple[str, List[dict]]:
+        """
+        Fit the messages into a context window.
+
+        :param directive: The system directive that starts every request
+        :param messages: All of the messages of the session, oldest first. Messages
+            with a truthy 'pinned' key are always sent in full.
+        :param functions: The descriptions of the functions the model may call
+        :return: A 2-tuple where the first element is the model to use and the
+            second is the messages to send to it, starting with the directive
+        """
+        fixed = (
+            PRIMING_TOKENS +
+            self.tokens([{'role': 'system', 'content': directive}]) +
+            self.tokens([msg for msg in messages if msg.get('pinned', False)]) +
+            (self.count(json.dumps(functions)) if functions else 0)
+        )
+        smallest = next(iter(self.windows))
+
+        def history():
+            unpinned = [msg for msg in messages if not msg.get('pinned', False)]
+            return unpinned[self.summarized:]
+
+        def size():
+            return fixed + self.tokens(self.summary_message()) + self.tokens(history())
+
+        if size() > self.budget(smallest) and len(history()) > self.keep:
+            old = history()[:len(history()) - self.keep]
+            summary = ''
+            if self.summarize:
+                try:
+                    summary = await self.summarize(self.summary, old)
+                except Exception:
+                    summary = ''  # evict the messages instead
+            self.summary = summary or self.summary
+            self.summarized += len(old)
+
+        model = next(
+            (model for model in self.windows if size() <= self.budget(model)),
+            list(self.windows)[-1]
+        )
+        # as a last resort evict the oldest messages, but always keep the last one
+        while size() > self.budget(model) and len(history()) > 1:
+            self.summarized += 1
+
+        return model, [
+            {'role': msg['role'], 'content': msg['content']}
+            for msg in [
+                {'role': 'system', 'content': directive},
+                *(msg for msg in messages if msg.get('pinned', False)),
+                *self.summary_message(),
+                *history()
+            ]
+        ]
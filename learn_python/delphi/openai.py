@@ -1,7 +1,9 @@
 import os
 import openai
+from openai.openai_object import OpenAIObject
 from pathlib import Path
 from learn_python.delphi.tutor import Tutor, ConfigurationError
+from learn_python.delphi.context import ContextWindow
 from learn_python.register import LLMBackends, Config
 from learn_python.utils import lp_logger
 from uuid import uuid1
@@ -20,7 +22,16 @@ class OpenAITutor(Tutor):
     """
 
     api_key = None
-    model_priority = ['gpt-4', 'gpt-3.5-turbo-instruct']
+
+    # the number of tokens in the context window of each model we use, smallest
+    # first - see ContextWindow
+    CONTEXT_WINDOWS = {
+        'gpt-4': 8192,
+        'gpt-4-32k': 32768
+    }
+
+    # the most tokens a summary of the conversation may take up
+    SUMMARY_TOKENS = 256
 
     # this is a gpt parameter, None will use the default
     # Lower values for temperature result in more consistent
@@ -34,6 +45,8 @@ class OpenAITutor(Tutor):
 
     BACKEND = LLMBackends.OPEN_AI
 
+    STREAMING = True
+
     API_KEY_FILE = Path(__file__).parent / 'openai_api.key'
 
     def __init__(self, api_key=api_key):
@@ -49,34 +62,119 @@ class OpenAITutor(Tutor):
             )
         
         openai.api_key = self.api_key
+        self.context = ContextWindow(self.CONTEXT_WINDOWS, summarize=self.summarize)
         lp_logger.info('Initialized OpenAI Tutor.')
 
-    def get_model(self, messages):
-        # todo - return 32k model for large messages
-        model = self.model_priority[0]
-        self.logger.info('get_model() = %s', model)
-        return model
+    async def request(self):
+        """
+        The arguments of the chat completion request for the messages on the stack,
+        fit into the context window of the smallest model they fit.
+        """
+        model, messages = await self.context.fit(
+            self.directive,
+            [
+                msg for msg in self.messages
+                if msg['content'] and not msg.get('is_function_call', False)
+            ],
+            self.functions
+        )
+        self.logger.info('request() = %s with %d messages', model, len(messages))
+        return {
+            'model': model,
+            'messages': messages,
+            'functions': self.functions
+        }
+
+    async def summarize(self, summary, messages):
+        """Summarize the oldest messages of the session, see ContextWindow."""
+        self.logger.info('summarize(%d messages)', len(messages))
+        openai.aiosession.set(self.client)
+        conversation = '\n'.join(f'{msg["role"]}: {msg["content"]}' for msg in messages)
+        if summary:
+            conversation = f'The summary so far: {summary}\n{conversation}'
+        response = await openai.ChatCompletion.acreate(
+            model=next(iter(self.CONTEXT_WINDOWS)),
+            messages=[{
+                'role': 'system',
+                'content': (
+                    'Summarize this conversation between a student and their Python '
+                    'tutor in a short paragraph. Keep anything the tutor needs to know '
+                    'to carry on helping the student.'
+                )
+            }, {
+                'role': 'user',
+                'content': conversation
+            }],
+            max_tokens=self.SUMMARY_TOKENS
+        )
+        return response['choices'][0]['message']['content']
+
+    async def open_client(self):
+        import aiohttp
+        return aiohttp.ClientSession()
+
+    async def close_client(self):
+        if self.client:
+            await self.client.close()
 
     async def send(self):
-        messages=[
-            {'role': 'system', 'content': self.directive},
-            *[
-                {'role': msg['role'], 'content': msg['content']}
-                for msg in self.messages
-                if msg['content'] and not msg.get('is_function_call', False)
-            ]
-        ]
         self.logger.info('send(), with directive')
-        return await openai.ChatCompletion.acreate(
-            model=self.get_model(messages),
-            messages=messages,
-            functions=self.functions
-        )
+        openai.aiosession.set(self.client)  # reuse the engagement's connections
+        return await openai.ChatCompletion.acreate(**await self.request())
+
+    async def stream(self):
+        self.logger.info('stream(), with directive')
+        openai.aiosession.set(self.client)  # reuse the engagement's connections
+        async for chunk in await openai.ChatCompletion.acreate(
+            **await self.request(), stream=True
+        ):
+            yield chunk
+
+    def accumulate(self, response, chunk):
+        """
+        Each chunk holds a delta of the message. Function calls arrive in pieces too -
+        the pieces of their names and arguments are joined until the stream ends.
+        """
+        if response is None:
+            response = {
+                'id': chunk.get('id', None),
+                'object': 'chat.completion',
+                'created': chunk.get('created', None),
+                'model': chunk.get('model', None),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': None},
+                    'finish_reason': None
+                }]
+            }
+        if not chunk.get('choices', None):
+            return response, ''
+        choice = response['choices'][0]
+        delta = chunk['choices'][0].get('delta', {})
+        text = delta.get('content', None) or ''
+        if text:
+            choice['message']['content'] = (choice['message']['content'] or '') + text
+        if delta.get('function_call', None):
+            function_call = choice['message'].setdefault(
+                'function_call', {'name': '', 'arguments': ''}
+            )
+            for key, part in delta['function_call'].items():
+                function_call[key] = function_call.get(key, '') + (part or '')
+        if chunk['choices'][0].get('finish_reason', None):
+            choice['finish_reason'] = chunk['choices'][0]['finish_reason']
+        return response, text
+
+    def cacheable(self, response):
+        # calling a function has side effects
+        return not response['choices'][0]['message'].get('function_call', None)
+
+    def dump_response(self, response):
+        return response.to_dict_recursive() if isinstance(response, OpenAIObject) else response
 
     def handle_response(self, response):
         # todo run any functions that were called out
         self.logger.info('handle_response(%s)', response)
-        self.resp_json.append(response.to_dict_recursive())
+        self.resp_json.append(self.dump_response(response))
         resp = response['choices'][0]['message']
         self.call_function(
             resp.get('function_call', {}).get('name', None),
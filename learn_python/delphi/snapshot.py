@@ -0,0 +1,188 @@
+import json
+import os
+from pathlib import Path
+from threading import RLock
+from typing import Dict, List, Optional, Tuple
+from learn_python.utils import ROOT_DIR, ConeOfSilence, lp_logger
+from learn_python.tests.tasks import Task, run_tasks
+from learn_python.tests.tests import tasks
+from learn_python.doc import INDEX_FILE, TaskMapper, task_map, prefetch_task_map, read_index
+
+
+SNAPSHOT_FILE = ROOT_DIR / '.tutor_snapshot.json'
+
+# bump this if the structure of the snapshot file changes
+SNAPSHOT_VERSION = 1
+
+
+def index_signature(path: Path = INDEX_FILE) -> Optional[List[float]]:
+    """The modification time and size of the course index, or None if it is missing."""
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+class TaskSnapshot:
+    """
+    The context tutor sessions start from, precomputed for every task: its
+    documentation and the closure of the other tasks it depends on. The snapshot is
+    taken from the course index (see TaskMapper.save_index()) and persisted, so
+    starting a session does not have to load, let alone build, the documentation.
+    It is only retaken when the index is rewritten - a documentation build that did
+    not change the index leaves it as is - and it is only trusted while the index
+    is fresh, see read_index().
+
+    Test results are not part of the snapshot. They are graded for a task and its
+    whole closure in one batch, and reused from the grading cache for every task
+    whose fingerprint has not changed. See run_tasks()
+
+    Usage::
+
+        snapshot = TaskSnapshot()
+        for task, docs in snapshot.context(task):
+            ...
+
+    :param path: The json file to persist the snapshot to
+    :param index: The course index the snapshot is taken from
+    """
+
+    path: Path
+    index: Path
+
+    # the signature of the course index the snapshot was taken from
+    signature: Optional[List[float]] = None
+
+    # module -> task name -> AssignmentDocs.to_dict()
+    docs: Dict[str, Dict[str, dict]]
+
+    # module -> task name -> [[module, task name], ...] in the order they are found
+    closures: Dict[str, Dict[str, List[List[str]]]]
+
+    def __init__(self, path: Path = SNAPSHOT_FILE, index: Path = INDEX_FILE):
+        self.path = path
+        self.index = index
+        self.docs = {}
+        self.closures = {}
+        self._lock = RLock()
+        try:
+            if self.path.is_file():
+                snapshot = json.loads(self.path.read_text())
+                if snapshot.get('version', None) == SNAPSHOT_VERSION:
+                    self.signature = snapshot['index']
+                    self.docs = snapshot['docs']
+                    self.closures = snapshot['closures']
+        except Exception:
+            lp_logger.exception('Unable to read tutor snapshot %s', self.path)
+
+    @property
+    def fresh(self) -> bool:
+        """
+        True if the snapshot was taken from the course index as it is now, and the
+        documentation sources have not changed since the index was saved.
+        """
+        return (
+            self.signature is not None and
+            self.signature == index_signature(self.index) and
+            read_index(self.index) is not None
+        )
+
+    def refresh(self, build: bool = True) -> bool:
+        """
+        Retake the snapshot if it is not fresh.
+
+        :param build: Build the documentation if the index is missing or stale.
+            Otherwise the snapshot is only retaken from a fresh index - this never
+            prints anything, so it is safe to run in the background.
+        :return: True if the snapshot is fresh
+        """
+        with self._lock:
+            if self.fresh:
+                return True
+            if build:
+                with ConeOfSilence():  # a doc parse is very chatty!
+                    mapper = task_map(refresh=True)
+            elif prefetch_task_map(refresh=True):
+                mapper = task_map()
+            else:
+                return False
+            self.take(mapper)
+            return self.fresh
+
+    def take(self, mapper: TaskMapper):
+        """Snapshot the documentation of every task in the task map and save it."""
+        with self._lock:
+            self.signature = index_signature(self.index)
+            self.docs = {
+                module: {task_name: docs.to_dict() for task_name, docs in mod_docs.items()}
+                for module, mod_docs in mapper.task_sections.items()
+            }
+            self.closures = {
+                module: {task_name: self.dependency_closure(module, task_name) for task_name in mod_docs}
+                for module, mod_docs in self.docs.items()
+            }
+            self.save()
+
+    def dependency_closure(self, module: str, task_name: str) -> List[List[str]]:
+        """
+        :return: All of the tasks the given task depends on, directly or indirectly,
+            depth first. The task itself is never included.
+        """
+        closure = []
+        def visit(mod, name):
+            for dep_module, dep_name in self.docs.get(mod, {}).get(name, {}).get('dependencies', []):
+                dependency = [dep_module, dep_name]
+                if dependency not in closure and dependency != [module, task_name]:
+                    closure.append(dependency)
+                    visit(dep_module, dep_name)
+        visit(module, task_name)
+        return closure
+
+    def get_docs(self, module: str, task_name: str) -> Optional[TaskMapper.AssignmentDocs]:
+        """
+        :return: The documentation of the task from the snapshot, or None if it has
+            none
+        """
+        self.refresh()
+        docs = self.docs.get(module, {}).get(task_name, None)
+        return TaskMapper.AssignmentDocs.from_dict(docs) if docs else None
+
+    def context(self, task: Task) -> List[Tuple[Task, TaskMapper.AssignmentDocs]]:
+        """
+        Gather everything a tutor session for the task starts from and grade the
+        task and its closure together.
+
+        :return: A list of 2-tuples where the first element is the Task instance and
+            the second is its documentation, starting with the given task followed
+            by its closure. Tasks without tests or documentation are left out.
+        """
+        self.refresh()
+        members = [(task.module, task.name)] + [
+            tuple(dependency)
+            for dependency in self.closures.get(task.module, {}).get(task.name, [])
+        ]
+        context = []
+        for module, task_name in members:
+            test = task if (module, task_name) == (task.module, task.name) else (
+                tasks.get(module, {}).get(task_name, None)
+            )
+            docs = self.docs.get(module, {}).get(task_name, None)
+            if test and docs:
+                context.append((test, TaskMapper.AssignmentDocs.from_dict(docs)))
+        run_tasks((test for test, _ in context), sandbox=True)
+        return context
+
+    def save(self):
+        """Write the snapshot to disk."""
+        try:
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps({
+                'version': SNAPSHOT_VERSION,
+                'index': self.signature,
+                'docs': self.docs,
+                'closures': self.closures
+            }))
+            os.replace(tmp, self.path)
+        except Exception:
+            lp_logger.exception('Unable to write tutor snapshot %s', self.path)
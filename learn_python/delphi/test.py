@@ -22,6 +22,11 @@ class TestAITutor(Tutor):
 
     BACKEND = LLMBackends.TEST
 
+    STREAMING = True
+
+    # the responses change from cycle to cycle
+    RESPONSE_CACHE = False
+
     cycle = 0
 
     CYCLE_LIMIT = randint(2, 6)
@@ -50,6 +55,15 @@ class TestAITutor(Tutor):
         self.cycle += 1
         return resp
 
+    async def stream(self):
+        self.logger.info('stream()')
+        for word in (await self.send()).split(' '):
+            yield word
+
+    def accumulate(self, response, chunk):
+        delta = chunk if response is None else f' {chunk}'
+        return (response or '') + delta, delta
+
     def handle_response(self, response):
         # todo run any functions that were called out
         self.logger.info('handle_response(%s)', response)
@@ -10,29 +10,32 @@ from termcolor import colored
 from typing import Optional, Union, List, Annotated
 from types import FunctionType
 from uuid import uuid1, UUID
-from learn_python.tests.tasks import Task, TaskStatus
+from learn_python.tests.tasks import Task, TaskStatus, run_tasks
 from learn_python.tests.tests import tasks
 from learn_python.client import CourseClient
 from learn_python.register import LLMBackends
 from learn_python.doc import (
-    task_map,
     TaskMapper,
     clean as clean_docs,
-    build as build_docs
+    stream_build,
+    DOC_BLD_DIR
 )
 from learn_python.register import Config
+from learn_python.delphi.context import ContextWindow
+from learn_python.delphi.cache import ResponseCache, context_fingerprint
+from learn_python.delphi.snapshot import TaskSnapshot
 import gzip
 import json
 from datetime import datetime
 from dateutil.tz import tzlocal
 from glob import glob
+from threading import Thread
 from warnings import warn
 import asyncio
 import sys
 from rich.console import Console
 from rich.markdown import Markdown
 from learn_python.utils import (
-    ConeOfSilence,
     GzipFileHandler,
     localize_identifier,
     ROOT_DIR,
@@ -130,6 +133,35 @@ class Tutor:
     no_prompt_rounds: int = 0
     NO_PROMPT_ROUNDS_LIMIT: int = 4
 
+    # backends that can send their responses as they are generated set this, see
+    # stream_response()
+    STREAMING: bool = False
+
+    # true if the last response was rendered as it streamed in
+    streamed: bool = False
+
+    # backends whose responses are not worth reusing turn this off, see cache_key()
+    RESPONSE_CACHE: bool = True
+    response_cache: Optional[ResponseCache] = None
+
+    # true if the last response came from the response cache
+    cache_hit: bool = False
+
+    # the precomputed task context sessions start from
+    snapshot: TaskSnapshot
+
+    # the documentation builds in the background while the conversation carries on
+    docs_build: Optional[Thread] = None
+
+    # the event loop the whole engagement runs on, see run()
+    loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # the backend's client, reused for the whole engagement, see open_client()
+    client = None
+
+    # fits the messages of each session into the backend's context window
+    context: Optional[ContextWindow] = None
+
     API_KEY_FILE = None
 
     INITIAL_NOTICE = """
@@ -163,6 +195,9 @@ Hi, I'm **Delphi**! \U0001F44B
         self.logger.propagate = False
         self.no_prompt_rounds = 0
         self.log = {}
+        if self.RESPONSE_CACHE:
+            self.response_cache = ResponseCache()
+        self.snapshot = TaskSnapshot()
 
         if api_key is None and self.API_KEY_FILE and self.API_KEY_FILE.is_file():
             self.api_key = self.API_KEY_FILE.read_text().strip()
@@ -176,6 +211,82 @@ Hi, I'm **Delphi**! \U0001F44B
         A wrapper around input() to allow for mocking during testing.
         """
         return input(prompt)
+
+    async def ainput(self, prompt):
+        """
+        Wait for input() on a reader thread, so that the event loop can carry on with
+        background work while the student is typing.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(setter, value):
+            if not future.done():
+                setter(value)
+
+        def read():
+            try:
+                result = self.input(prompt)
+            except BaseException as err:
+                outcome = (future.set_exception, err)
+            else:
+                outcome = (future.set_result, result)
+            try:
+                loop.call_soon_threadsafe(resolve, *outcome)
+            except RuntimeError:
+                pass  # the engagement ended while we were waiting
+
+        # a daemon, so a reader still waiting on the terminal does not hold up exit
+        Thread(target=read, daemon=True).start()
+        return await future
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        """Get the engagement's event loop, starting it and the backend's client if need be."""
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+            self.client = self.loop.run_until_complete(self.open_client())
+        return self.loop
+
+    def run(self, coroutine):
+        """
+        Run the coroutine to completion on the engagement's event loop. Unlike
+        asyncio.run() the loop, and the backend's client, live until the engagement
+        is over. Any background work progresses whenever the loop is running.
+        """
+        return self.get_loop().run_until_complete(coroutine)
+
+    def background(self, coroutine) -> asyncio.Task:
+        """
+        Schedule work to overlap with the student's think time. Blocking work can be
+        wrapped in asyncio.to_thread().
+        """
+        return self.get_loop().create_task(coroutine)
+
+    def close_loop(self):
+        """Cancel any unfinished background work, close the client and stop the loop."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.run_until_complete(self.close_client())
+        self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
+        self.client = None
+
+    async def open_client(self):
+        """
+        Open any client the backend can reuse for every request of the engagement,
+        like an http session with its connection pool.
+
+        :return: The client, or None if the backend has none
+        """
+        return None
+
+    async def close_client(self):
+        """Close the client returned by open_client()."""
     
     @classmethod
     def write_key(cls, key=None):
@@ -218,7 +329,7 @@ Hi, I'm **Delphi**! \U0001F44B
         self.logger.info('prompt()')
         if msg is None:
             self.no_prompt_rounds = 0
-            msg = self.input('> ')
+            msg = self.run(self.ainput('> '))
         else:
             self.no_prompt_rounds += 1
 
@@ -228,16 +339,17 @@ Hi, I'm **Delphi**! \U0001F44B
                 f'{self.me} has gotten confused and exceeded the number of rounds without user input.'
             )
         
-        Console().print(  # render as markdown to the terminal.
-            Markdown(
-                self.push(  # log the response message
-                    'assistant',
-                    self.handle_response(  # call any functions
-                        asyncio.run(self.get_response(msg, role=role))  # asynchronously send the message
-                    )
-                ) or ''  # response may have been null if certain functions were called
-            )
+        message = self.push(  # log the response message
+            'assistant',
+            self.handle_response(  # call any functions
+                self.run(self.get_response(msg, role=role))  # asynchronously send the message
+            ),
+            cached=self.cache_hit
         )
+        if not self.streamed:  # streamed responses are rendered as they arrive
+            Console().print(  # render as markdown to the terminal.
+                Markdown(message or '')  # response may have been null if certain functions were called
+            )
 
     async def spinner(self):
         """
@@ -261,13 +373,79 @@ Hi, I'm **Delphi**! \U0001F44B
         self.logger.info(f'get_response()')
         if message:
             self.push(role, message)
-        spinner_task = asyncio.create_task(self.spinner())
-        response = await self.send()
-        spinner_task.cancel()
-        sys.stdout.write('\r')
-        sys.stdout.flush()
+        self.streamed = False
+        key = self.cache_key()
+        cached = self.response_cache.get(key) if key else None
+        self.cache_hit = cached is not None
+        if self.cache_hit:
+            self.logger.info('cache hit %s', key)
+            return self.load_response(cached)
+        if self.STREAMING:
+            response = await self.stream_response()
+        else:
+            spinner_task = asyncio.create_task(self.spinner())
+            response = await self.send()
+            spinner_task.cancel()
+            sys.stdout.write('\r')
+            sys.stdout.flush()
+        if key and self.cacheable(response):
+            self.response_cache.put(key, self.dump_response(response))
+            self.response_cache.save()
+        return response
+
+    def cache_key(self) -> Optional[str]:
+        """
+        Get the key the response to the messages on the stack is cached under. Only
+        responses to the system context alone are cached - like the explanation that
+        starts a session for a task - because nothing the student wrote can change
+        them.
+
+        :return: The key, or None if the response should not be cached
+        """
+        if (
+            self.response_cache is None or
+            not self.messages or
+            any(msg['role'] != 'system' for msg in self.messages)
+        ):
+            return None
+        return context_fingerprint(self.BACKEND.value, self.directive, messages=self.messages)
+
+    def cacheable(self, response) -> bool:
+        """Backends return False for responses that should never be reused."""
+        return True
+
+    def dump_response(self, response):
+        """Convert the response to something json serializable, for the response cache."""
         return response
+
+    def load_response(self, data):
+        """Convert a response from the response cache back into a response."""
+        return data
     
+    async def stream_response(self):
+        """
+        Get the response to the messages on the stack, rendering its text to the
+        terminal as markdown as it is generated. A spinner is displayed until the
+        first of the text arrives.
+        """
+        from rich.live import Live
+        from rich.spinner import Spinner
+        response, text = None, ''
+        self.streamed = True
+        with Live(
+            Spinner('line'),
+            console=Console(),
+            refresh_per_second=12,
+            vertical_overflow='visible'
+        ) as live:
+            async for chunk in self.stream():
+                response, delta = self.accumulate(response, chunk)
+                if delta:
+                    text += delta
+                    live.update(Markdown(text))
+            live.update(Markdown(text))
+        return response
+
     async def send(self):
         """
         Send the message chain and return a response.
@@ -275,6 +453,31 @@ Hi, I'm **Delphi**! \U0001F44B
         raise NotImplementedError(
             f'Extending LLM backends must implement send.'
         )
+
+    async def stream(self):
+        """
+        Send the message chain and yield the response in chunks as it is generated.
+        Backends that set STREAMING must implement this and accumulate().
+        """
+        raise NotImplementedError(
+            f'Extending LLM backends that stream must implement stream.'
+        )
+        yield
+
+    def accumulate(self, response, chunk):
+        """
+        Fold a chunk from stream() into the response so far. Once the stream ends the
+        response must be the same as the one send() would have returned, so that it
+        can be passed to handle_response().
+
+        :param response: The response so far, None for the first chunk
+        :param chunk: The next chunk from stream()
+        :return: A 2-tuple where the first element is the response so far and the
+            second is any text the chunk added to the message
+        """
+        raise NotImplementedError(
+            f'Extending LLM backends that stream must implement accumulate.'
+        )
     
     def handle_response(self, response):
         """
@@ -306,11 +509,14 @@ Hi, I'm **Delphi**! \U0001F44B
         :param code: If true, include the current task implementation code in the description (default: false)
         :return: A string containing the natural language description of the task.
         """
-        test.run()
+        test.run(isolate=True)
         description = f'The task {docs.name} asks me to:\n{docs.todo}\n'
         if self.task_test.status == TaskStatus.PASSED:
             description += f'The test for {docs.name} is passing!\n'
-        elif self.task_test.status in [TaskStatus.ERROR, TaskStatus.FAILED]:
+        elif self.task_test.status == TaskStatus.FAILED and test.violations:
+            violations = "\n".join([f'* {violation}' for violation in test.violations])
+            description += f'My implementation of {docs.name} works, but it does not meet these requirements:\n{violations}\n'
+        elif self.task_test.status in [TaskStatus.ERROR, TaskStatus.FAILED, TaskStatus.RELOAD_ERROR, TaskStatus.TOO_SLOW]:
             description += f'The test for {docs.name} is failing with this error: {test.error_msg}\n'
         elif self.task_test.status == TaskStatus.SKIPPED:
             description += f'I have not attempted to implement {docs.name} yet.\n'
@@ -329,7 +535,8 @@ Hi, I'm **Delphi**! \U0001F44B
         # sanity check
         assert self.task_test and self.task_docs, f'Cannot initialize {self.me} for a task without a test and documentation to rely on.'
         self.logger.info('init_for_task(%s)', self.task_test.name)
-        self.task_test.run()
+        # the task and everything it depends on are graded together
+        context = self.snapshot.context(self.task_test)
         message = f'I have set the task I need help with to "{self.task_test.name}". '
         message += self.get_task_description(
             self.task_test,
@@ -338,25 +545,19 @@ Hi, I'm **Delphi**! \U0001F44B
             requirements=True,
             code=True
         )
+        for test, docs in context[1:]:
+            message += self.get_task_description(test, docs, code=True)
 
-        dependency_set = set()
-        def get_all_dependencies(test_docs):
-            for module_dep, task_dep in test_docs.dependencies:
-                module, test, docs = self.get_task_info(task_dep, module_dep)
-                if module and test and docs:
-                    dependency_set.add((module, test, docs))
-                    get_all_dependencies(docs)
-        
-        get_all_dependencies(self.task_docs)
-
-        for module, test, docs in dependency_set:
-            if module and test and docs:
-                message += self.get_task_description(test, docs, code=True)
+        # the task must not be summarized away however long the session runs
+        self.push('system', message.strip(), pinned=True)
 
-        self.push('system', message.strip())
+    def push(self, role, message='', function_call=False, pinned=False, cached=False):
+        """
+        Add message to history
 
-    def push(self, role, message='', function_call=False):
-        """Add message to history"""
+        :param pinned: Always send this message in full, see ContextWindow
+        :param cached: The message is a response from the response cache
+        """
         self.logger.info('push(role=%s, message=%s)', role, message)
         if message:
             self.messages.append({
@@ -364,6 +565,8 @@ Hi, I'm **Delphi**! \U0001F44B
                 'content': message,
                 'timestamp': now(),
                 'function_call': function_call,
+                'pinned': pinned,
+                'cached': cached,
                 'backend_extra': self.pop_resp_json()
             })
         return message
@@ -405,11 +608,14 @@ Hi, I'm **Delphi**! \U0001F44B
         while not (possibles := self.possible_tasks(task_name)):
             qry = f'{task_name} is not an assignment, the assignments are:\n'
             not_working = []
+            run_tasks(
+                (task for mod_tasks in tasks.values() for task in mod_tasks.values()),
+                sandbox=True
+            )
             for module, mod_tasks in tasks.items():
                 qry += f'In {module}: {",".join(mod_tasks.keys())}\n'
                 for task_name, task in mod_tasks.items():
-                    task.run()
-                    if task.status in [TaskStatus.ERROR, TaskStatus.FAILED]:
+                    if task.status in [TaskStatus.ERROR, TaskStatus.FAILED, TaskStatus.RELOAD_ERROR, TaskStatus.TOO_SLOW]:
                         not_working.append((module, task_name)) 
 
             for broken in not_working:
@@ -447,12 +653,15 @@ Hi, I'm **Delphi**! \U0001F44B
             Config().register()
         os.makedirs(LOG_DIR, exist_ok=True)
         self.logger.info('%s.init(%s, %s)', self.__class__.__name__, task, strip_colors(notice))
+        # the task documentation is needed as soon as the student names a task
+        self.background(asyncio.to_thread(self.snapshot.refresh, build=False))
         try:
             self.start_session(task=task, notice=notice)
         except RestartSession as err:
             # a little tail recursion never hurt anybody
             self.init(task=self.task_test, notice=str(err))
         self.close_session()
+        self.close_loop()
         if self.file_handler:
             self.file_handler.close()
         return self
@@ -470,8 +679,7 @@ Hi, I'm **Delphi**! \U0001F44B
         return None, None
 
     def get_docs(self, module: str, task_name: str):
-        with ConeOfSilence():  # this might trigger a doc parse which is very chatty!
-            return task_map().get_task_doc(module, task_name)
+        return self.snapshot.get_docs(module, task_name)
     
     def close_session(self):
         if self.session_id >= 0 and not self.closed:
@@ -504,6 +712,8 @@ Hi, I'm **Delphi**! \U0001F44B
         self.session_id += 1
         self.closed = False
         self.messages = []
+        if self.context:
+            self.context.reset()
         self.session_start = now()
         self.session_end = None
         self.task_test = None
@@ -565,7 +775,7 @@ Hi, I'm **Delphi**! \U0001F44B
         self.logger.info('test(%s)', localize_identifier(self.task_test.identifier))
         print(colored(f'poetry run pytest {localize_identifier(self.task_test.identifier)}', 'blue'))
 
-        self.task_test.run(force=True)
+        self.task_test.run(force=True, isolate=True)
         if self.task_test.status == TaskStatus.PASSED:
             print(colored(
                 f'{self.task_test.name} is passing now! Good job! '
@@ -587,7 +797,28 @@ Hi, I'm **Delphi**! \U0001F44B
             clean_docs()
             return
         print(colored('poetry run doc build', 'blue'))
-        build_docs()
+        if self.docs_build and self.docs_build.is_alive():
+            print(colored('The documentation is already being built.', 'yellow'))
+            return
+        self.docs_build = Thread(target=self.build_docs, daemon=True)
+        self.docs_build.start()
+
+    def build_docs(self):
+        """
+        Build the documentation, logging its progress, and tell the student when it
+        is done.
+        """
+        for event in stream_build(output=lambda line: self.logger.debug('docs: %s', line)):
+            self.logger.info('docs: %s (%s)', event, event.duration)
+        if event.error:
+            print(colored(f'The documentation build failed:\n{event.error}', 'red'))
+            return
+        from learn_python.register import do_report
+        do_report()
+        index = DOC_BLD_DIR / 'html' / 'index.html'
+        print(colored(f'The documentation has been built: {index}', 'green'))
+        import webbrowser
+        webbrowser.open_new_tab(f'file:///{index}')
 
     def set_task(self, task_name: str):
         """
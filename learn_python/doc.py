@@ -4,12 +4,21 @@ import typer
 from contextlib import contextmanager
 from learn_python.tests.tests import tasks as task_tests
 from learn_python.tests.utils import import_string
-from learn_python.tests.tasks import TaskStatus
+from learn_python.tests.tasks import TaskStatus, run_tasks
+from learn_python.tests.pool import cpu_count
 import re
-from functools import cached_property
+from functools import cached_property, partial
+from collections import deque
+from time import perf_counter, time as timestamp
+import asyncio
+import subprocess
+import sys
+from threading import Lock
 from sphinx.application import Sphinx
+from sphinx.environment import CONFIG_OK
 from docutils.nodes import (
     document,
+    Element,
     section,
     GenericNodeVisitor,
     SkipChildren,
@@ -19,13 +28,16 @@ from docutils.nodes import (
     Text,
     reference,
     list_item,
-    literal_block
+    literal_block,
+    raw
 )
 from os import PathLike
 from termcolor import colored
 from sphinx.ext.todo import Todo
 from sphinx.addnodes import desc, pending_xref
-from typing import List, Dict, Union, Optional, Tuple, Annotated
+from typing import (
+    List, Dict, Union, Optional, Tuple, Annotated, Callable, Iterator, AsyncIterator
+)
 from types import FunctionType, ModuleType
 from enum import Enum, auto
 from warnings import warn
@@ -33,10 +45,14 @@ import inspect
 from learn_python.utils import ROOT_DIR, GITHUB_ROOT
 from docutils.parsers.rst import Directive
 import json
+import ast
+import hashlib
 from learn_python.utils import ConeOfSilence, configure_logging
 
 _mapper = None
+_mapper_lock = Lock()
 DETACHED_DEFAULT = False
+GRADING_PROCESSES_DEFAULT = cpu_count()
 
 
 CODE_REF_RE = re.compile(r'(?:(?P<name>.+)\s*\<(?P<link1>[^>.]+)[.](?P<ext1>.+)\>)|(?:(?P<link2>[^>.]+)[.](?P<ext2>.+))')
@@ -76,14 +92,42 @@ def code_ref_role(name, rawtext, text, lineno, inliner, options={}, content=[]):
     return [node], []
 
 
-def task_map():
+def task_map(refresh: bool = False):
+    """
+    :param refresh: Reload the task map, building the documentation if need be,
+        if the course index went stale since the task map was loaded
+    :return: The task map, loaded from the course index if it is fresh and built
+        from the documentation otherwise
+    """
     global _mapper
-    if _mapper is None:
-        _mapper = TaskMapper()
-        _mapper.build()
+    with _mapper_lock:
+        if _mapper is None or (refresh and read_index() is None):
+            _mapper = TaskMapper()
+            if not _mapper.load_index():
+                _mapper.build()
     return _mapper
 
 
+def prefetch_task_map(refresh: bool = False) -> bool:
+    """
+    Load the task map from the course index, if it is fresh, so that task_map()
+    does not have to. This is meant to be run in the background - unlike task_map()
+    it never builds the documentation, which is chatty.
+
+    :param refresh: Reload the task map if the course index went stale since it
+        was loaded
+    :return: True if the task map is loaded, and fresh if refresh is given
+    """
+    global _mapper
+    with _mapper_lock:
+        if _mapper is None or (refresh and read_index() is None):
+            mapper = TaskMapper()
+            if not mapper.load_index():
+                return False
+            _mapper = mapper
+        return True
+
+
 def setup(app):
     global _mapper
     global DETACHED_DEFAULT
@@ -92,19 +136,58 @@ def setup(app):
     # after each one!
     lock_reporting()
     app.add_config_value('detached', DETACHED_DEFAULT, 'env', types=[bool])
+    app.add_config_value('grading_processes', GRADING_PROCESSES_DEFAULT, '', types=[int])
+    app.add_config_value('build_events', False, '', types=[bool])
     app.add_role('code-ref', code_ref_role)
     if not _mapper:
         # if the mapper already exists we're not hooking into a documentation build
         # process, therefore we shouldn't register our event callback because the
         # doctree has already been built externally
         _mapper = TaskMapper()
+        app.connect('env-get-outdated', _mapper.get_outdated)
+        app.connect('env-purge-doc', _mapper.purge_task_results)
+        app.connect('doctree-read', _mapper.record_task_results)
+        app.connect('env-merge-info', _mapper.merge_task_results)
         app.connect('doctree-resolved', _mapper.process_doctree)
+        app.connect('build-finished', _mapper.write_index)
+        app.connect('build-finished', _mapper.save_status_groups)
+        app.connect('build-finished', _mapper.refresh_navigation)
+        BuildReporter().connect(app)
+    # the tasks are graded before any documents are read and the doctrees are only
+    # edited as they are resolved, which sphinx always does in the main process, so
+    # documents can be read and written in parallel
+    return {
+        'parallel_read_safe': True,
+        'parallel_write_safe': True
+    }
 
 
 DOC_DIR = Path(__file__).parent.parent / 'docs'
 DOC_SRC_DIR = DOC_DIR / 'source'
 DOC_BLD_DIR = DOC_DIR / 'build'
 
+# the precompiled course structure, see TaskMapper.save_index()
+INDEX_FILE = DOC_BLD_DIR / 'course.json'
+
+# bump this whenever the layout of the index file changes
+INDEX_VERSION = 2
+
+MODULE_RGX = re.compile(r'(?P<module>module[\d]+)')
+
+# toctree anchors to tasks look like any of:
+#   #module-learn_python.module2_basics.gateway2.task1_is_odd
+#   #module2-identity-matrix2
+#   #list-intersection2
+ANCHOR_RGX = re.compile(
+    r'^#(?P<path>.*[.])?(?:(?P<module>module[\d]+)[_-])?(?:task[\d]*_)?(?P<task>[\w-]+)$'
+)
+
+# the tasks each gateway and module status is determined by, for `doc refresh`
+STATUS_GROUPS_FILE = DOC_BLD_DIR / 'status.json'
+
+# closes the results of a task in the html, see TaskMapper.process_doctree()
+RESULTS_END = '<!--/results-->'
+
 
 app = typer.Typer(
     help=(
@@ -255,10 +338,26 @@ class TaskMapper:
 
     # the toctree gateway assignment hierarchy
     hierarchy = None
+
+    # module -> gateway -> task names, see hierarchy_to_dict()
+    gateways: Dict[str, Dict[str, List[str]]]
+
+    # true once all of the tasks have been run for the documentation build
+    graded: bool = False
+
+    # true if the status of any task changed since the documents were last read,
+    # see get_outdated()
+    statuses_changed: bool = False
+
+    # the status class of each gateway and module -> the (module, task) pairs whose
+    # statuses determine theirs, see status_class()
+    status_groups: Dict[str, set]
     
     def __init__(self):
         self.tasks = {}
         self.task_sections = {}
+        self.status_groups = {}
+        self.gateways = {}
 
     class AssignmentDocs:
         """
@@ -378,6 +477,36 @@ class TaskMapper:
             self.autodoc = AutodocTree(document)
             self.node.walkabout(self.autodoc)
 
+        def to_dict(self):
+            return {
+                'name': self.name,
+                'source': self.source,
+                'gateway_source': self.gateway_source,
+                'todo': self.todo,
+                'requirements': self.requirements,
+                'hints': self.hints,
+                'dependencies': self.dependencies
+            }
+
+        @classmethod
+        def from_dict(cls, docs: dict):
+            """
+            Load the docs from the course structure index. These have no pointers into
+            the documentation tree - node, gateway_node and autodoc are None.
+            """
+            assignment = cls.__new__(cls)
+            assignment.node = None
+            assignment.gateway_node = None
+            assignment.autodoc = None
+            assignment.name = docs['name']
+            assignment.source = docs['source']
+            assignment.gateway_source = docs['gateway_source']
+            assignment.todo = docs['todo']
+            assignment.requirements = docs['requirements']
+            assignment.hints = docs['hints']
+            assignment.dependencies = [tuple(dep) for dep in docs['dependencies']]
+            return assignment
+
 
     class AssignmentCollector(GenericNodeVisitor):
 
@@ -439,16 +568,99 @@ class TaskMapper:
         avoid editing the doctree. This might happen as part of our tutor execution
         flow for example, where we need access to the structured data from the
         docs but aren't building them.
+
+        The environment pickled by the last build under the doctree directory is
+        reused. Only the sources that changed since then are read again, and if
+        none did nothing is built at all.
         """
         self.task_sections.clear()
         self.tasks.clear()
-        self.app.build()
+        if self.outdated:
+            # the dummy builder writes nothing, so this only brings the environment
+            # and the doctrees on disk up to date
+            self.app.builder.build(
+                [],
+                summary='sources that changed since the last build',
+                method='update'
+            )
+        self.read_doctrees()
+        self.save_index()
+
+    def read_doctrees(self):
+        """Parse the tasks out of the doctrees of every document in the environment."""
         for doc_name in self.app.env.found_docs:
             self.read_tasks(
                 self.app.env.get_doctree(doc_name),
                 doc_name
             )
 
+    def write_index(self, app, exception):
+        """
+        This is the callback registered to emit the course structure index at the
+        end of a documentation build. The doctrees of all documents are read for
+        it, not just the ones this build wrote.
+        """
+        if exception is None:
+            mapper = TaskMapper()
+            mapper._app = app
+            mapper.read_doctrees()
+            mapper.save_index()
+
+    def save_index(self, path: PathLike = INDEX_FILE):
+        """
+        Save the task documentation to a compact index file that can be loaded
+        without parsing any of the documentation, see load_index(). The source
+        files the documentation was built from are recorded so we can tell when
+        the index goes stale.
+        """
+        env = self.app.env
+        sources = {Path(env.doc2path(doc_name)) for doc_name in env.found_docs}
+        for doc_name in env.found_docs:
+            sources.update(
+                Path(env.srcdir) / dependency
+                for dependency in env.dependencies.get(doc_name, [])
+            )
+        sources.add(DOC_SRC_DIR / 'conf.py')
+        index = {
+            'version': INDEX_VERSION,
+            'documents': sorted(str(doc) for doc in find_documents()),
+            'sources': {
+                str(source.resolve()): source_signature(source)
+                for source in sorted(sources) if source.is_file()
+            },
+            'tasks': {
+                module: {
+                    task_name: docs.to_dict() for task_name, docs in tasks.items()
+                } for module, tasks in self.task_sections.items()
+            },
+            'gateways': hierarchy_to_dict(self.hierarchy or self.get_gateway_hierarchy())
+        }
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as index_file:
+                json.dump(index, index_file)
+        except OSError as err:
+            warn(f'Unable to save the course structure index: {err}')
+
+    def load_index(self, path: PathLike = INDEX_FILE) -> bool:
+        """
+        Load the task documentation from the index file if it is still fresh, see
+        read_index().
+
+        :return: True if the index was loaded, False if it is missing or stale
+        """
+        index = read_index(path)
+        if index is None:
+            return False
+        self.task_sections.clear()
+        for module, tasks in index['tasks'].items():
+            self.task_sections[module] = {
+                task_name: self.AssignmentDocs.from_dict(docs)
+                for task_name, docs in tasks.items()
+            }
+        self.gateways = index['gateways']
+        return True
+
     def process_doctree(self, app, tree, doc_name):
         """
         This is the callback registered to hook into the documentation build
@@ -465,8 +677,16 @@ class TaskMapper:
             task_test = self.get_task_test(module, task)
             task_doc = self.get_task_doc(module, task)
             task_test.run()
-            task_doc.node['classes'].extend(['task', task_test.status.css])
-
+            task_doc.node['classes'].extend([
+                'task', task_test.status.css, status_class('task', module, task)
+            ])
+
+            # mark where the results go so `doc refresh` can rewrite them
+            task_doc.node += raw(
+                '',
+                f'<!--{status_class("results", module, task)} {section_depth(task_doc.node) + 1}-->',
+                format='html'
+            )
             if task_test.error:
                 err_section = section(ids=[f'{task_test.name}-error'])
                 err_section['classes'].append('error-output')
@@ -491,14 +711,19 @@ class TaskMapper:
                 para_node = literal_block(para_text, para_text)
                 impl_section += para_node
                 task_doc.node += impl_section
+            task_doc.node += raw('', RESULTS_END, format='html')
             
             # change todo's to completed's because we can!
-            if task_test.status == TaskStatus.PASSED:
-                for todo in task_doc.node.traverse(Todo.node_class):
+            for todo in task_doc.node.traverse(Todo.node_class):
+                todo['classes'].append(status_class('todo', module, task))
+                if task_test.status == TaskStatus.PASSED:
                     todo[0].children[0] = Text('Completed')
 
             if 'gateway' not in task_doc.gateway_node['classes']:
                 task_doc.gateway_node['classes'].extend(['gateway'])
+            self.status_groups.setdefault(
+                status_class('gateway', module, task_doc.gateway_node[0].astext()), set()
+            ).add((module, task))
             
             if not hasattr(task_doc.gateway_node, '_task_status'):
                 task_doc.gateway_node._task_status = TaskStatus.NOT_RUN
@@ -508,7 +733,10 @@ class TaskMapper:
         
         for task in tasks:
             task_doc = self.get_task_doc(module, task)
-            task_doc.gateway_node['classes'].append(task_doc.gateway_node._task_status.css)
+            task_doc.gateway_node['classes'].extend([
+                task_doc.gateway_node._task_status.css,
+                status_class('gateway', module, task_doc.gateway_node[0].astext())
+            ])
 
         self.process_toctree(doc_name)
 
@@ -519,7 +747,11 @@ class TaskMapper:
                     isinstance(sect.parent, document) and 
                     any([module in ident.lower() for ident in sect['ids']])
                 ):
-                    sect['classes'].extend(['module-section', self.hierarchy[module]['status'].css])
+                    sect['classes'].extend([
+                        'module-section',
+                        self.hierarchy[module]['status'].css,
+                        status_class('module', module)
+                    ])
 
 
     def read_tasks(self, tree, doc_name):
@@ -551,101 +783,217 @@ class TaskMapper:
         """
         if self._app is None:
             self._app = app
-            # run all of our tasks
-            for _, tasks in task_tests.items():
-                for _, task in tasks.items():
-                    task.run()
+            self.grade_tasks(app)
             
             # build the task hierarchy
             self.hierarchy = self.get_gateway_hierarchy()
 
             # annotate the tree with css status classes
-            for _, mod_parts in self.hierarchy.items():
+            for module, mod_parts in self.hierarchy.items():
+                module_class = status_class('module', module)
                 for node in mod_parts['nodes']:
-                    node['classes'].extend(['module', mod_parts['status'].css])
-                for _, gtwy_parts in mod_parts['gateways'].items():
+                    node['classes'].extend(['module', mod_parts['status'].css, module_class])
+                for gateway, gtwy_parts in mod_parts['gateways'].items():
+                    gateway_class = status_class('gateway', module, gateway)
                     for node in gtwy_parts['nodes']:
-                        node['classes'].extend(['gateway', gtwy_parts['status'].css])
-                    for _, task_parts in gtwy_parts['tasks'].items():
+                        node['classes'].extend(['gateway', gtwy_parts['status'].css, gateway_class])
+                    for task, task_parts in gtwy_parts['tasks'].items():
+                        self.status_groups.setdefault(module_class, set()).add((module, task))
+                        self.status_groups.setdefault(gateway_class, set()).add((module, task))
                         for node in task_parts['nodes']:
-                            node['classes'].extend(['task', task_parts['status'].css])
+                            node['classes'].extend([
+                                'task', task_parts['status'].css, status_class('task', module, task)
+                            ])
         return self.hierarchy
 
+    def grade_tasks(self, app):
+        """
+        Run all of our tasks, spread across worker processes if there are enough
+        cpus for them to pay unless grading_processes is 0. See run_tasks()
+        """
+        if not self.graded:
+            tasks = [task for tasks in task_tests.values() for task in tasks.values()]
+            start = perf_counter()
+            emit_event(app, BuildEvent(EventKind.GRADE_START, total=len(tasks)))
+            run_tasks(tasks, processes=app.config.grading_processes or None)
+            self.graded = True
+            emit_event(app, BuildEvent(
+                EventKind.GRADE_END, total=len(tasks), duration=perf_counter() - start
+            ))
+
+    @staticmethod
+    def task_result(task_test) -> list:
+        """The parts of a task's test results that are written into its documentation."""
+        return [task_test.status.name, task_test.error_msg] if task_test else [None, None]
+
+    def get_outdated(self, app, env, added, changed, removed):
+        """
+        This is the callback registered to tell sphinx which documents need to be
+        read again even though their sources did not change - the ones with tasks
+        whose results changed since they were last written, and the pages of the
+        modules those tasks belong to. Changes to the task code itself are picked up
+        by sphinx because autodoc records the task modules as dependencies.
+
+        This means the tasks are graded before any documents are read. The results
+        each document was read with are kept in the environment, see
+        record_task_results()
+        """
+        self.grade_tasks(app)
+        if not hasattr(env, 'task_results'):
+            # we do not know what the documents were read with
+            env.task_results = {}
+            return list(env.found_docs)
+        outdated = set()
+        for doc_name, results in env.task_results.items():
+            mtch = self.MODULE_RGX.search(doc_name)
+            if not mtch:
+                continue
+            module = mtch.groupdict()['module']
+            current = {
+                task: self.task_result(self.get_task_test(module, task)) for task in results
+            }
+            if current != results:
+                outdated.update([doc_name, module])
+                self.statuses_changed = self.statuses_changed or any(
+                    current[task][0] != result[0] for task, result in results.items()
+                )
+        return list(outdated & env.found_docs)
+
+    def refresh_navigation(self, app, exception):
+        """
+        This is the callback registered to bring the statuses in the navigation of
+        the pages this build did not write up to date. The sidebar of every page shows
+        the status of every module, gateway and task, but only the pages with tasks
+        whose results changed are written again - see get_outdated(). Pages sphinx
+        generates without documents, like the highlighted module sources, are never
+        written again. The status groups must be saved first, see
+        save_status_groups()
+        """
+        if exception is None and self.statuses_changed and app.builder.format == 'html':
+            refresh_html(app.outdir)
+
+    def save_status_groups(self, app, exception):
+        """
+        This is the callback registered to save which tasks each gateway and module
+        status is determined by, for `doc refresh`. Only the groups of the documents
+        written by this build are known, so they are merged into the saved ones.
+        """
+        if exception is None and self.status_groups:
+            groups = load_status_groups()
+            groups.update({
+                group: sorted(tasks) for group, tasks in self.status_groups.items()
+            })
+            try:
+                with open(STATUS_GROUPS_FILE, 'w') as groups_file:
+                    json.dump(groups, groups_file)
+            except OSError as err:
+                warn(f'Unable to save the status groups: {err}')
+
+    def record_task_results(self, app, tree):
+        """
+        This is the callback registered to record the results of the tasks in each
+        document as it is read. When documents are read in parallel this runs in
+        the reader processes, see merge_task_results()
+        """
+        module, tasks = TaskMapper().read_tasks(tree, app.env.docname)
+        app.env.task_results[app.env.docname] = {
+            task: self.task_result(self.get_task_test(module, task)) for task in tasks
+        }
+
+    def merge_task_results(self, app, env, doc_names, other):
+        """
+        This is the callback registered to merge the task results recorded by a
+        parallel reader process into the main environment.
+        """
+        for doc_name in doc_names:
+            if doc_name in other.task_results:
+                env.task_results[doc_name] = other.task_results[doc_name]
+
+    def purge_task_results(self, app, env, doc_name):
+        """This is the callback registered to forget the task results of removed and reread documents"""
+        getattr(env, 'task_results', {}).pop(doc_name, None)
+
+    @cached_property
+    def anchor_index(self) -> Dict[str, Dict[str, str]]:
+        """
+        The task names of each module, keyed by their normalized form. See
+        anchor_key()
+        """
+        return {
+            module: {anchor_key(task_name): task_name for task_name in tasks.keys()}
+            for module, tasks in task_tests.items()
+        }
+
+    def anchor_task(self, module: str, anchor: str) -> Optional[str]:
+        """
+        Get the task a toctree reference in the given module's documentation points
+        to, if any.
+
+        :param module: The module the toctree belongs to
+        :param anchor: The anchor name of the reference
+        :return: The task name or None if the reference is not to a task of the module
+        """
+        mtch = ANCHOR_RGX.match(anchor)
+        if not mtch:
+            return None
+        # some sanity checks
+        mentioned = MODULE_RGX.findall(mtch.group('path') or '')
+        if mtch.group('module'):
+            mentioned.append(mtch.group('module'))
+        if mentioned and mentioned[-1] != module:
+            return None
+        return self.anchor_index.get(module, {}).get(anchor_key(mtch.group('task')), None)
+
     def get_gateway_hierarchy(self):
         """
         Get the gateway task hierarchy from the toctree.
+
+        There is not a unified toctree - there is a toctree for each document, and
+        each tree is partial! The link data are buried in leaf references, so we
+        infer if a reference is to a task by looking its anchor up in anchor_index,
+        and find its task, gateway and module list items - in that order - from a
+        map of the list items each node is nested in. Each tree is walked once.
+        All this depends on naming conventions - so stick to the rules!
         """
         # module -> gateway -> task
         hierarchy = {}
-        module_rgx = re.compile(r'(?P<module>module[\d]+)')
-        anchor_rgx = re.compile(r'^#(.*(?P<module>module[\d]+)(?:_[\w]+)?[.-](?:(?P<gateway>gateway[\d]+)(?:_[\w]+)?[.-])?(?:task(?P<task_num>[\d]*)_)?)?(?P<task>[\w-]+)')
-        # its really annoying to traverse toc trees, because the link data are not
-        # discoverable via parent/child relationships because they are buried in leaf nodes off the parents
-        # our strategy here is to try to infer if a given node is a leaf task reference by matching its anchor to known task
-        # names for the module it is in
-        # this is an insane amount of work to do this... if you're having trouble understanding this code, one of the complexities
-        # is that there is not a unified toctree - there is a toctree for each document, and each tree is partial!
-        # all this can be a bit brittle and it depends on naming conventions - so stick to the rules!
         for doc_name, toctree in self.app.env.tocs.items():
-            match = module_rgx.search(doc_name)
-            if match:
-                module = match.groupdict()['module']
-                hierarchy.setdefault(module, {'gateways': {}, 'nodes': set(), 'status': TaskStatus.NOT_RUN})
-                mod_hierarchy = hierarchy[module]
-                task_names = set(task_tests.get(module, {}).keys())
-                for ref in toctree.traverse(reference):
-                    match = anchor_rgx.match(ref.get('anchorname', ''))
-                    if match:
-                        parts = match.groupdict()
-
-                        # some sanity checks
-                        if parts['module'] and parts['module'] != module:
-                            continue
-
-                        # spaces and _s may have been permuted to - by the anchor
-                        if not (
-                            ((task_name := parts['task']) in task_names) or 
-                            ((task_name := parts['task'].replace('-', '')) in task_names) or
-                            ((task_name := parts['task'].replace('-', '_')) in task_names)
-                        ):
-                            continue
-
-                        # we have a gateway task reference
-                        # walk up the tree and find our list nodes, should be module -> gateway -> task
-                        branch = ref
-                        while (branch := branch.parent) and not isinstance(branch, list_item):
-                            pass
-                        task_node = branch
-                        assert task_node
-
-                        while (branch := branch.parent) and not isinstance(branch, list_item):
-                            pass
-                        gateway_node = branch
-
-                        while (branch := branch.parent) and not isinstance(branch, list_item):
-                            pass
-
-                        # some partial trees will not have a top level module item
-                        if branch:
-                            mod_hierarchy['nodes'].add(branch)
-
-                        gateway_name = gateway_node[0][0].astext()
-                        mod_hierarchy['gateways'].setdefault(gateway_name, {'nodes': set(), 'tasks': {}, 'status': TaskStatus.NOT_RUN})
-                        gtwy_hierarchy = mod_hierarchy['gateways'][gateway_name]
-                        if gateway_node:
-                            gtwy_hierarchy['nodes'].add(gateway_node)
-                        gtwy_hierarchy['tasks'].setdefault(task_name, {'nodes': set(), 'status': TaskStatus.NOT_RUN})
-                        gtwy_hierarchy['tasks'][task_name]['nodes'].add(task_node)
-                        gtwy_hierarchy['tasks'][task_name]['status'] = task_tests[module][task_name].status
-
-                    elif ref['refuri'] in hierarchy:
-                        # we might have a dangling top node, without sub anchors to key off of, in these cases we need to map
-                        # to the correct module
-                        branch = ref
-                        while (branch := branch.parent) and not isinstance(branch, list_item):
-                            pass
-                        hierarchy[ref['refuri']]['nodes'].add(branch)
-
+            match = MODULE_RGX.search(doc_name)
+            if not match:
+                continue
+            module = match.group('module')
+            hierarchy.setdefault(module, {'gateways': {}, 'nodes': set(), 'status': TaskStatus.NOT_RUN})
+            mod_hierarchy = hierarchy[module]
+            parents = list_item_parents(toctree)
+            for ref in toctree.traverse(reference):
+                anchor = ref.get('anchorname', '')
+                if not anchor:
+                    # we might have a dangling top node, without sub anchors to key off of,
+                    # in these cases we need to map to the correct module
+                    if ref['refuri'] in hierarchy and parents[ref]:
+                        hierarchy[ref['refuri']]['nodes'].add(parents[ref])
+                    continue
+
+                task_name = self.anchor_task(module, anchor)
+                if not task_name:
+                    continue
+
+                # we have a gateway task reference, should be module -> gateway -> task
+                task_node = parents[ref]
+                gateway_node = parents.get(task_node, None)
+                assert task_node and gateway_node
+
+                # some partial trees will not have a top level module item
+                if module_node := parents.get(gateway_node, None):
+                    mod_hierarchy['nodes'].add(module_node)
+
+                gateway_name = gateway_node[0][0].astext()
+                mod_hierarchy['gateways'].setdefault(gateway_name, {'nodes': set(), 'tasks': {}, 'status': TaskStatus.NOT_RUN})
+                gtwy_hierarchy = mod_hierarchy['gateways'][gateway_name]
+                gtwy_hierarchy['nodes'].add(gateway_node)
+                gtwy_hierarchy['tasks'].setdefault(task_name, {'nodes': set(), 'status': TaskStatus.NOT_RUN})
+                gtwy_hierarchy['tasks'][task_name]['nodes'].add(task_node)
+                gtwy_hierarchy['tasks'][task_name]['status'] = task_tests[module][task_name].status
 
         for module, mod_parts in hierarchy.items():
             for _, gtwy_parts in mod_parts['gateways'].items():
@@ -656,6 +1004,7 @@ class TaskMapper:
                 if mod_parts['status'] < gtwy_parts['status']:
                     mod_parts['status'] = gtwy_parts['status']
 
+        self.gateways = hierarchy_to_dict(hierarchy)
         return hierarchy
 
     def check(self):
@@ -698,6 +1047,19 @@ class TaskMapper:
     def get_task_test(self, module, task_name):
         return task_tests.get(module, {}).get(task_name, None)
 
+    @property
+    def outdated(self) -> bool:
+        """
+        True if the environment is missing, was built with a different
+        configuration or any of the documentation sources were added, changed or
+        removed since it was built.
+        """
+        env = self.app.env
+        if env.config_status != CONFIG_OK:
+            return True
+        env.find_files(self.app.config, self.app.builder)
+        return any(env.get_outdated_files(config_changed=False))
+
     @cached_property
     def app(self):
         """Get a sphinx app for parsing the documentation, that will use our doc's configuration."""
@@ -710,6 +1072,573 @@ class TaskMapper:
         )
 
 
+def find_documents() -> List[Path]:
+    """Find all of the reStructuredText sources of the documentation."""
+    return sorted(DOC_SRC_DIR.rglob('*.rst'))
+
+
+def read_index(path: PathLike = INDEX_FILE) -> Optional[dict]:
+    """
+    Read the course index, see TaskMapper.save_index(). The index is stale if any
+    of the documentation sources were added, removed or changed since it was saved.
+    Python sources only count as changed if their docstrings changed, so editing
+    task code does not invalidate the index.
+
+    :return: The index, or None if it is missing or stale
+    """
+    try:
+        with open(path, 'r') as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if (
+        index.get('version', None) != INDEX_VERSION or
+        index['documents'] != sorted(str(doc) for doc in find_documents())
+    ):
+        return None
+    for source, (mtime, digest) in index['sources'].items():
+        source = Path(source)
+        if not source.is_file():
+            return None
+        if source.stat().st_mtime != mtime and (
+            digest is None or source_signature(source)[1] != digest
+        ):
+            return None
+    return index
+
+
+def source_signature(source: Path) -> Tuple[float, Optional[str]]:
+    """
+    Get the modification time of the source file, and for python sources a digest
+    of just their docstrings - the only part of them the documentation includes.
+
+    :return: A (modification time, digest) 2-tuple, the digest is None for files
+        that are not python or cannot be parsed
+    """
+    digest = None
+    if source.suffix == '.py':
+        try:
+            tree = ast.parse(source.read_text())
+            digest = hashlib.sha256('\0'.join(
+                ast.get_docstring(node, clean=False) or ''
+                for node in ast.walk(tree)
+                if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+            ).encode()).hexdigest()
+        except (OSError, SyntaxError, ValueError):
+            pass
+    return source.stat().st_mtime, digest
+
+
+def anchor_key(name: str) -> str:
+    """
+    Normalize a task name or the task part of a toctree anchor so they can be
+    compared - spaces and _s may have been permuted to - by the anchor.
+    """
+    return re.sub(r'[\s_-]+', '', name).lower()
+
+
+def list_item_parents(tree) -> Dict[Element, Optional[list_item]]:
+    """
+    Map every node in the tree to the closest list item it is nested in, in a
+    single pass.
+
+    :param tree: The tree to map, usually a toctree
+    :return: A dictionary of nodes to list items, or None for the nodes that are not
+        in a list item
+    """
+    parents = {}
+    stack = [(tree, None)]
+    while stack:
+        node, item = stack.pop()
+        parents[node] = item
+        if isinstance(node, list_item):
+            item = node
+        if isinstance(node, Element):
+            stack.extend((child, item) for child in node.children)
+    return parents
+
+
+def hierarchy_to_dict(hierarchy: dict) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Strip the nodes and statuses out of a hierarchy from get_gateway_hierarchy(),
+    leaving a json serializable module -> gateway -> task names hierarchy.
+    """
+    return {
+        module: {
+            gateway: list(gtwy_parts['tasks'].keys())
+            for gateway, gtwy_parts in mod_parts['gateways'].items()
+        } for module, mod_parts in hierarchy.items()
+    }
+
+
+def status_class(kind: str, *names: str) -> str:
+    """
+    Get the css class that identifies the elements in the built html that show
+    the status of a task, gateway or module - or the todos of a task - so that
+    `doc refresh` can find them.
+
+    :param kind: task, todo, gateway, module or results
+    :param names: The module, and the name of the task or gateway
+    """
+    return '-'.join([
+        'status', kind,
+        *(re.sub(r'\W+', '-', name).strip('-').lower() for name in names)
+    ])
+
+
+def section_depth(node) -> int:
+    """The number of sections the node is nested in, counting itself if it is one."""
+    depth = 0
+    while node is not None:
+        depth += isinstance(node, section)
+        node = node.parent
+    return depth
+
+
+def load_status_groups() -> Dict[str, list]:
+    try:
+        with open(STATUS_GROUPS_FILE, 'r') as groups_file:
+            return json.load(groups_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_results(task_test, level: int, permalink: str = '') -> str:
+    """
+    Render the error and implementation sections of a task the way sphinx renders
+    the sections TaskMapper.process_doctree() adds to the doctree - the blocks are
+    highlighted by the same highlighter with the default language, like sphinx does
+    for literal blocks without a language.
+
+    :param task_test: The task
+    :param level: The heading level of the sections
+    :param permalink: The text of the links to the section headings
+    """
+    from sphinx.highlighting import PygmentsBridge
+    from docutils.writers._html_base import HTMLTranslator
+    highlighter = PygmentsBridge('html')
+
+    def render_section(ident, css, title_text, block):
+        return (
+            f'<section class="{css}" id="{ident}">\n'
+            f'<h{level}>{title_text.translate(HTMLTranslator.special_characters)}'
+            f'<a class="headerlink" href="#{ident}" '
+            f'title="Link to this heading">{permalink}</a></h{level}>\n'
+            f'<div class="highlight-default notranslate">'
+            f'{highlighter.highlight_block(block, "default")}</div>\n'
+            f'</section>\n'
+        )
+
+    html = ''
+    if task_test.error:
+        title_text = 'Error'
+        if task_test.error_msg:
+            title_text += f': {task_test.error_msg}'
+        html += render_section(
+            f'{task_test.name}-error', 'error-output', title_text, task_test.error
+        )
+    if task_test.implementation:
+        html += render_section(
+            f'{task_test.name}-implementation',
+            'task-implementation',
+            'Implementation',
+            task_test.implementation
+        )
+    return html
+
+
+def refresh_html(html_dir: PathLike = DOC_BLD_DIR / 'html') -> List[Path]:
+    """
+    Patch the results of the tasks into the already built html, without running
+    sphinx. The status classes of the tasks, gateways and modules are rewritten,
+    along with the task todos and the error and implementation sections. The tasks
+    must have been run.
+
+    The patched pages are the same as sphinx would write them, but the search index
+    is not updated - it only covers the results the documentation was last built
+    with until the next build.
+
+    :param html_dir: The directory holding the built html
+    :return: The html files that changed
+    """
+    statuses = {
+        status_class('task', module, task_name): task.status
+        for module, tasks in task_tests.items() for task_name, task in tasks.items()
+    }
+    for group, members in load_status_groups().items():
+        statuses[group] = max(
+            (task_tests[module][task].status for module, task in members
+             if task in task_tests.get(module, {})),
+            default=TaskStatus.NOT_RUN
+        )
+    status_css = {status.css for status in TaskStatus}
+
+    def patch_classes(mtch):
+        classes = mtch.group(1).split()
+        status = next(
+            (statuses[css] for css in classes if css.startswith('status-') and css in statuses),
+            None
+        )
+        if status is None:
+            return mtch.group(0)
+        classes = [css for css in classes if css not in status_css]
+        classes.insert(1 if len(classes) > 1 else len(classes), status.css)
+        return f'class="{" ".join(classes)}"'
+
+    def patch_todo(mtch):
+        module, task_name = mtch.group('module'), mtch.group('task')
+        task = task_tests.get(module, {}).get(task_name, None)
+        if not task:
+            return mtch.group(0)
+        return mtch.group('start') + (
+            'Completed' if task.status is TaskStatus.PASSED else 'Todo'
+        ) + mtch.group('end')
+
+    def patch_results(mtch, permalink):
+        task = task_tests.get(mtch.group('module'), {}).get(mtch.group('task'), None)
+        if not task:
+            return mtch.group(0)
+        return mtch.group('start') + render_results(
+            task, int(mtch.group('level')), permalink
+        ) + RESULTS_END
+
+    todo_rgx = re.compile(
+        r'(?P<start><div class="[^"]*\bstatus-todo-(?P<module>module\d+)-(?P<task>\w+)\b'
+        r'[^"]*"[^>]*>\s*<p class="admonition-title">)[^<]*(?P<end></p>)'
+    )
+    results_rgx = re.compile(
+        r'(?P<start><!--status-results-(?P<module>module\d+)-(?P<task>\w+) (?P<level>\d+)-->)'
+        r'.*?' + re.escape(RESULTS_END),
+        re.DOTALL
+    )
+    permalink_rgx = re.compile(r'<a class="headerlink"[^>]*>([^<]*)</a>')
+    changed = []
+    for page in Path(html_dir).rglob('*.html'):
+        html = page.read_text()
+        if 'status-' not in html:
+            continue
+        patched = re.sub(r'class="([^"]*)"', patch_classes, html)
+        patched = todo_rgx.sub(patch_todo, patched)
+        # use the same permalink text the theme gave the other headings
+        permalink = permalink_rgx.search(html)
+        patched = results_rgx.sub(
+            partial(patch_results, permalink=permalink.group(1) if permalink else ''),
+            patched
+        )
+        if patched != html:
+            page.write_text(patched)
+            changed.append(page)
+    return changed
+
+
+class EventKind(Enum):
+    """The steps of a documentation build that are reported as BuildEvents."""
+
+    GRADE_START = 'grade-start'
+    GRADE_END = 'grade-end'
+    READ_START = 'read-start'
+    READ = 'read'
+    READ_END = 'read-end'
+    WRITE_START = 'write-start'
+    RESOLVE = 'resolve'
+    WRITE = 'write'
+    FINISHED = 'finished'
+
+
+class BuildEvent:
+    """
+    A structured progress event from a documentation build. Builds run with the
+    build_events config value set print these on their output, one per line - see
+    BuildReporter and stream_build()
+
+    :param kind: The step of the build
+    :param doc: The document the step was for, if it was for one
+    :param duration: How many seconds the step took, if known
+    :param total: The number of tasks or documents the phase will process, if known
+    :param error: What went wrong, only for the finished events of failed builds
+    :param time: When the event happened in seconds since the epoch
+    """
+
+    # event lines start with this
+    PREFIX = '@build-event '
+
+    kind: EventKind
+    doc: Optional[str] = None
+    duration: Optional[float] = None
+    total: Optional[int] = None
+    error: Optional[str] = None
+    time: float
+
+    def __init__(self, kind, doc=doc, duration=duration, total=total, error=error, time=None):
+        self.kind = EventKind(kind)
+        self.doc = doc
+        self.duration = duration
+        self.total = total
+        self.error = error
+        self.time = timestamp() if time is None else time
+
+    def __str__(self):
+        return self.kind.value + (f' {self.doc}' if self.doc else '')
+
+    def to_dict(self):
+        return {
+            'kind': self.kind.value,
+            'doc': self.doc,
+            'duration': self.duration,
+            'total': self.total,
+            'error': self.error,
+            'time': self.time
+        }
+
+    def to_line(self) -> str:
+        return self.PREFIX + json.dumps(self.to_dict())
+
+    @classmethod
+    def from_line(cls, line: str) -> Optional['BuildEvent']:
+        """
+        :return: The event the output line holds, or None if it is not an event line
+        """
+        if not line.startswith(cls.PREFIX):
+            return None
+        return cls(**json.loads(line[len(cls.PREFIX):]))
+
+
+def emit_event(app, event: BuildEvent):
+    """Print the event on stdout if the build is reporting its progress."""
+    if app.config.build_events:
+        # a single write, so lines from parallel readers and writers do not interleave
+        sys.stdout.write(event.to_line() + '\n')
+        sys.stdout.flush()
+
+
+class BuildReporter:
+    """
+    Reports the progress of a documentation build as BuildEvents. Documents may be
+    read and written in worker processes, so the start times of their steps are
+    kept by whichever process is working on them.
+    """
+
+    started: Dict[Tuple[EventKind, str], float]
+
+    writing: bool = False
+
+    def __init__(self):
+        self.started = {}
+
+    def connect(self, app):
+        app.connect('env-before-read-docs', self.read_start)
+        app.connect('source-read', self.source_read)
+        app.connect('doctree-read', self.doctree_read)
+        app.connect('env-updated', self.read_end)
+        # around the other handlers, including TaskMapper.process_doctree()
+        app.connect('doctree-resolved', self.resolving, priority=100)
+        app.connect('doctree-resolved', self.resolved, priority=900)
+        app.connect('html-page-context', self.page_context)
+
+    def elapsed(self, kind: EventKind, doc: str = '') -> Optional[float]:
+        start = self.started.pop((kind, doc), None)
+        return None if start is None else perf_counter() - start
+
+    def read_start(self, app, env, doc_names):
+        self.started[(EventKind.READ_START, '')] = perf_counter()
+        emit_event(app, BuildEvent(EventKind.READ_START, total=len(doc_names)))
+
+    def source_read(self, app, doc_name, source):
+        self.started[(EventKind.READ, doc_name)] = perf_counter()
+
+    def doctree_read(self, app, tree):
+        doc_name = app.env.docname
+        emit_event(app, BuildEvent(
+            EventKind.READ, doc=doc_name, duration=self.elapsed(EventKind.READ, doc_name)
+        ))
+
+    def read_end(self, app, env):
+        emit_event(app, BuildEvent(
+            EventKind.READ_END, duration=self.elapsed(EventKind.READ_START)
+        ))
+
+    def resolving(self, app, tree, doc_name):
+        if not self.writing:
+            self.writing = True
+            emit_event(app, BuildEvent(EventKind.WRITE_START))
+        self.started[(EventKind.RESOLVE, doc_name)] = perf_counter()
+        self.started[(EventKind.WRITE, doc_name)] = perf_counter()
+
+    def resolved(self, app, tree, doc_name):
+        emit_event(app, BuildEvent(
+            EventKind.RESOLVE, doc=doc_name, duration=self.elapsed(EventKind.RESOLVE, doc_name)
+        ))
+
+    def page_context(self, app, page_name, template_name, context, tree):
+        # also called for pages that are not documents, like the index and search
+        emit_event(app, BuildEvent(
+            EventKind.WRITE, doc=page_name, duration=self.elapsed(EventKind.WRITE, page_name)
+        ))
+
+
+def build_command(
+    detached: bool = DETACHED_DEFAULT,
+    processes: int = GRADING_PROCESSES_DEFAULT,
+    jobs: str = 'auto'
+) -> List[str]:
+    """
+    The command `make html` runs, with BuildEvents turned on. Sphinx is quiet, so
+    everything else it prints is a warning or an error.
+    """
+    return [
+        sys.executable, '-m', 'sphinx', '-M', 'html',
+        str(DOC_SRC_DIR), str(DOC_BLD_DIR), '-q',
+        '-j', str(jobs),
+        '-D', f'detached={int(detached)}',
+        '-D', f'grading_processes={processes}',
+        '-D', 'build_events=1'
+    ]
+
+
+class BuildOutput:
+    """
+    Sort the output of a documentation build into BuildEvents and everything else.
+
+    :param output: Called with each line of output that is not an event
+    """
+
+    output: Optional[Callable[[str], None]] = None
+    start: float
+
+    # the last lines of output that were not events, to explain failures
+    tail: deque
+
+    def __init__(self, output=output):
+        self.output = output
+        self.start = perf_counter()
+        self.tail = deque(maxlen=20)
+
+    def parse(self, line: str) -> Optional[BuildEvent]:
+        line = line.rstrip('\n')
+        event = BuildEvent.from_line(line)
+        if event is None:
+            self.tail.append(line)
+            if self.output:
+                self.output(line)
+        return event
+
+    def finished(self, returncode: int) -> BuildEvent:
+        return BuildEvent(
+            EventKind.FINISHED,
+            duration=perf_counter() - self.start,
+            error=(
+                '\n'.join(self.tail) or f'sphinx exited with status {returncode}'
+            ) if returncode else None
+        )
+
+
+def stream_build(output: Optional[Callable[[str], None]] = None, **options) -> Iterator[BuildEvent]:
+    """
+    Build the documentation in a sphinx subprocess, yielding its BuildEvents as they
+    happen. The last event is always the finished event, which holds the error if
+    the build failed.
+
+    Usage::
+
+        for event in stream_build(processes=0):
+            print(event, event.duration)
+
+    :param output: Called with each line sphinx prints that is not an event - these
+        are warnings and errors
+    :param options: The options of build_command()
+    """
+    out = BuildOutput(output)
+    with subprocess.Popen(
+        build_command(**options),
+        cwd=DOC_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    ) as process:
+        for line in process.stdout:
+            if event := out.parse(line):
+                yield event
+    yield out.finished(process.returncode)
+
+
+async def astream_build(
+    output: Optional[Callable[[str], None]] = None,
+    **options
+) -> AsyncIterator[BuildEvent]:
+    """
+    stream_build() for asyncio, so an event loop can carry on while the
+    documentation builds.
+    """
+    out = BuildOutput(output)
+    process = await asyncio.create_subprocess_exec(
+        *build_command(**options),
+        cwd=DOC_DIR,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
+    async for line in process.stdout:
+        if event := out.parse(line.decode()):
+            yield event
+    yield out.finished(await process.wait())
+
+
+def render_build(**options) -> BuildEvent:
+    """
+    Build the documentation, showing its progress on the terminal.
+
+    :param options: The options of build_command()
+    :return: The finished event
+    """
+    from rich.progress import (
+        Progress, SpinnerColumn, TextColumn, BarColumn, MofNCompleteColumn, TimeElapsedColumn
+    )
+    from learn_python.tests.performance import format_seconds
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn('{task.description}'),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn()
+    ) as progress:
+        phases = {}
+
+        def finish(phase, description):
+            progress.update(
+                phases[phase],
+                total=progress.tasks[phases[phase]].completed or 1,
+                completed=progress.tasks[phases[phase]].completed or 1,
+                description=description
+            )
+
+        for event in stream_build(
+            output=lambda line: progress.console.print(
+                line, markup=False, highlight=False, soft_wrap=True
+            ),
+            **options
+        ):
+            if event.kind is EventKind.GRADE_START:
+                phases['grade'] = progress.add_task('Grading tasks', total=event.total)
+            elif event.kind is EventKind.GRADE_END:
+                progress.update(phases['grade'], completed=event.total)
+                finish('grade', f'Graded tasks in {format_seconds(event.duration)}')
+            elif event.kind is EventKind.READ_START:
+                phases['read'] = progress.add_task('Reading', total=event.total)
+            elif event.kind is EventKind.READ:
+                progress.update(phases['read'], advance=1, description=f'Reading {event.doc}')
+            elif event.kind is EventKind.READ_END:
+                finish('read', f'Read documents in {format_seconds(event.duration)}')
+            elif event.kind is EventKind.WRITE_START:
+                phases['write'] = progress.add_task('Writing', total=None)
+            elif event.kind is EventKind.WRITE:
+                progress.update(phases['write'], advance=1, description=f'Writing {event.doc}')
+            elif event.kind is EventKind.FINISHED:
+                if 'write' in phases:
+                    finish('write', f'Wrote pages, done in {format_seconds(event.duration)}')
+                return event
+
+
 @contextmanager
 def doc_context():
     assert DOC_DIR.is_dir()
@@ -740,18 +1669,46 @@ def build(
     open: Annotated[
         bool,
         typer.Option(help='Open the built documentation in a browser.')
-    ] = True
+    ] = True,
+    processes: Annotated[
+        int,
+        typer.Option(
+            help='The number of worker processes to grade tasks with, 0 grades them in the build process.'
+        )
+    ] = GRADING_PROCESSES_DEFAULT,
+    clean_first: Annotated[
+        bool,
+        typer.Option(
+            '--clean/--incremental',
+            help=(
+                'Delete the built documentation and rebuild all of it, or only rebuild '
+                'the pages whose sources or task results changed.'
+            )
+        )
+    ] = False,
+    jobs: Annotated[
+        str,
+        typer.Option(
+            help='The number of processes to read and write the documentation with, auto uses all cores.'
+        )
+    ] = 'auto'
 ):
-    """Build the documentation - this will always clean it first."""
+    """
+    Build the documentation. By default only the pages whose sources changed, or
+    that hold tasks whose results changed, are rebuilt.
+    """
     configure_logging()
-    clean()
+    if clean_first:
+        clean()
     try:
         import logging
         logging.getLogger('testing').info('[START] docs')
-        with doc_context():
-            os.system(f'make html SPHINXOPTS="-D detached={int(detached)}"')
+        finished = render_build(detached=detached, processes=processes, jobs=jobs)
     finally:
         logging.getLogger('testing').info('[STOP] docs')
+    if finished.error:
+        print(colored(finished.error, 'red'))
+        raise typer.Exit(1)
     print(DOC_BLD_DIR / 'html')
     from learn_python.register import do_report
     do_report()
@@ -761,22 +1718,70 @@ def build(
 
 
 @app.command()
-def structure():
+def refresh(
+    processes: Annotated[
+        int,
+        typer.Option(
+            help='The number of worker processes to grade tasks with, 0 grades them in this process.'
+        )
+    ] = GRADING_PROCESSES_DEFAULT
+):
+    """
+    Grade the tasks and patch their results into the built documentation, without
+    rebuilding it. Run `doc build` when the documentation itself changes, or to
+    make the new results searchable.
+    """
+    index = Path(DOC_BLD_DIR) / 'html' / 'index.html'
+    if not index.is_file() or not STATUS_GROUPS_FILE.is_file():
+        raise typer.Exit('The documentation has not been built yet. Run: `poetry run doc build`.')
+    with ConeOfSilence():
+        run_tasks(
+            (task for tasks in task_tests.values() for task in tasks.values()),
+            processes=processes or None
+        )
+    changed = refresh_html()
+    print(f'Refreshed {len(changed)} pages in {DOC_BLD_DIR / "html"}')
+
+
+@app.command()
+def structure(
+    results: Annotated[
+        bool,
+        typer.Option(
+            help='Grade the tasks and include their results and time/memory profiles.'
+        )
+    ] = False
+):
     """Spit out a json representation of the course structure."""
     structure = {}
+    if results:
+        with ConeOfSilence():
+            run_tasks(task for mod_tasks in task_tests.values() for task in mod_tasks.values())
     with ConeOfSilence():
         # todo - ConeOfSilence not entirely effective - still prints some stuff about downloading youtube thumbnails
+        task_gateways = {
+            (module, task_name): gateway
+            for module, gateways in task_map().gateways.items()
+            for gateway, task_names in gateways.items() for task_name in task_names
+        }
         for module, tasks in task_map().task_sections.items():
             for task_name, task in tasks.items():
                 test = task_map().get_task_test(module, task_name)
                 if test:
                     structure.setdefault(module, {})[task_name] = {
                         'number': test.number,
+                        'gateway': task_gateways.get((module, task_name), None),
                         'test': test.identifier,
                         'todo': task.todo,
                         'hints': task.hints,
                         'requirements': task.requirements
                     }
+                    if results:
+                        structure[module][task_name].update({
+                            'status': test.status.name,
+                            'error': test.error_msg,
+                            'profile': test.profile.to_dict() if test.profile else None
+                        })
     print(json.dumps(structure, indent=4))
 
 
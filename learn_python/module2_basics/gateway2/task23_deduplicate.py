@@ -4,14 +4,18 @@
 
 .. admonition:: Requirement:
 
-    Your implementation must be a single statement
+    Your implementation must be a single statement, and its run time must grow no
+    faster than the length of the sequence.
 
     
 .. hint::
     * use set() and type coercion
-    * the order of a set() is undefined
-    * checkout the key argument on built-in `sorted() <https://docs.python.org/3/library/functions.html#sorted>`_ 
-      and the list method `list.index() <https://docs.python.org/3/tutorial/datastructures.html>`_
+    * the order of a set() is undefined, but the keys of a dict() keep the order
+      they were added in - checkout the dict method
+      `dict.fromkeys() <https://docs.python.org/3/library/stdtypes.html#dict.fromkeys>`_
+    * searching a list with `list.index() <https://docs.python.org/3/tutorial/datastructures.html>`_
+      looks at every element before the one it finds, doing that for every element
+      is too slow
     * you will need a ternary if-else expression
 """
 
@@ -6,6 +6,12 @@
 
     * You may not use sets.
     * You must use for loops.
+    * Your run time must grow no faster than the lengths of the lists.
+
+.. hint::
+    Checking whether a list contains an element looks at every element of the
+    list, so doing it for every element of the other list is too slow. A dict
+    can tell whether it has a key without looking at every key.
 """
 
 
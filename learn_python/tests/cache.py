@@ -0,0 +1,190 @@
+import ast
+import sys
+import json
+import inspect
+import hashlib
+import importlib
+import os
+from pathlib import Path
+from functools import cache
+from importlib.metadata import version, PackageNotFoundError
+from typing import Optional, Iterable
+from learn_python.utils import ROOT_DIR, lp_logger
+from learn_python.tests.utils import import_string
+from learn_python.tests.tasks import Task, TaskStatus, TaskProfile
+from learn_python.tests.reload import ModuleReloader
+
+
+CACHE_FILE = ROOT_DIR / '.grading_cache.json'
+
+# bump this if the structure of the cache file changes
+CACHE_VERSION = 1
+
+# the distributions whose versions can change the outcome of a test
+DEPENDENCIES = ['pytest', 'pytest-timeout', 'numpy', 'scipy', 'matplotlib']
+
+# the modules the tests grade with, besides the test modules themselves
+GRADING_HELPERS = [
+    'learn_python.tests.utils',
+    'learn_python.tests.rules',
+    'learn_python.tests.performance',
+    'learn_python.tests.complexity'
+]
+
+# task results that are not worth remembering because they may be transient
+UNCACHEABLE = [
+    TaskStatus.NOT_RUN,
+    TaskStatus.ERROR,
+    TaskStatus.RELOAD_ERROR,
+    TaskStatus.TOO_SLOW  # timings depend on what else the machine is doing
+]
+
+
+@cache
+def environment_fingerprint():
+    """The versions of Python and the libraries that the tests depend on."""
+    versions = [sys.version]
+    for dist in DEPENDENCIES:
+        try:
+            versions.append(f'{dist}=={version(dist)}')
+        except PackageNotFoundError:
+            versions.append(f'{dist}==None')
+    return '\n'.join(versions)
+
+
+def read_source(path):
+    path = Path(path)
+    return path.read_bytes() if path.is_file() else b''
+
+
+@cache
+def helpers_fingerprint():
+    """The sources of the modules the tests grade with, see GRADING_HELPERS"""
+    digest = hashlib.sha256()
+    for name in GRADING_HELPERS:
+        digest.update(read_source(importlib.import_module(name).__file__))
+    return digest.hexdigest()
+
+
+def task_fingerprint(task: Task, siblings: Optional[dict] = None):
+    """
+    Hash everything that can change the outcome of a task's test: the task's
+    source file, the sources of the modules the task code imports from (see
+    ModuleReloader.closure()), the source of the test module (the test function
+    and its helpers), the modules the tests grade with, the source files of any
+    other tasks the test imports with import_task() and the versions of Python
+    and the test dependencies.
+
+    :param task: The task to fingerprint
+    :param siblings: The tasks in the same module keyed by name, used to resolve
+        the tasks the test depends on
+    :return: A hex digest string
+    """
+    digest = hashlib.sha256(environment_fingerprint().encode())
+    digest.update(helpers_fingerprint().encode())
+    digest.update(read_source(task.path))
+    for name in sorted(ModuleReloader().closure(task.module_names)):
+        module = sys.modules.get(name, None)
+        if getattr(module, '__file__', None):
+            digest.update(read_source(module.__file__))
+    test = import_string(task.test)
+    if test is not None:
+        test_module = inspect.getmodule(test)
+        digest.update(read_source(test_module.__file__))
+        for node in ast.walk(ast.parse(inspect.getsource(test))):
+            if (
+                isinstance(node, ast.Call) and
+                isinstance(node.func, ast.Name) and
+                node.func.id == 'import_task' and
+                node.args and
+                isinstance(node.args[0], ast.Constant)
+            ):
+                dependency = (siblings or {}).get(node.args[0].value, None)
+                if dependency and dependency is not task:
+                    digest.update(read_source(dependency.path))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    A persistent, on-disk cache of task results keyed by task fingerprints. See
+    task_fingerprint(). Results are only reused if nothing that could change them
+    has changed since they were recorded.
+
+    :param path: The json file to persist the cache to
+    """
+
+    path: Path
+    results: dict
+
+    def __init__(self, path: Path = CACHE_FILE):
+        self.path = path
+        self.results = {}
+        try:
+            if self.path.is_file():
+                cached = json.loads(self.path.read_text())
+                if cached.get('version', None) == CACHE_VERSION:
+                    self.results = cached.get('results', {})
+        except Exception:
+            lp_logger.exception('Unable to read grading cache %s', self.path)
+
+    @staticmethod
+    def identifier(task: Task):
+        return f'{task.module}::{task.name}'
+
+    def load(self, task: Task, fingerprint: str) -> bool:
+        """
+        Set the task's results from the cache if they are still valid.
+
+        :return: True if the cached results were used, False otherwise
+        """
+        result = self.results.get(self.identifier(task), None)
+        if result and result['fingerprint'] == fingerprint:
+            task.status = TaskStatus[result['status']]
+            task.error = result['error']
+            task.profile = TaskProfile.from_dict(result.get('profile', None))
+            task.violations = result.get('violations', None)
+            return True
+        return False
+
+    def store(self, task: Task, fingerprint: str):
+        """Record the task's results, if they are worth remembering."""
+        if task.status in UNCACHEABLE:
+            self.results.pop(self.identifier(task), None)
+            return
+        self.results[self.identifier(task)] = {
+            'fingerprint': fingerprint,
+            'status': task.status.name,
+            'error': task.error,
+            'error_msg': task.error_msg,
+            'profile': task.profile.to_dict() if task.profile else None,
+            'violations': task.violations
+        }
+
+    def save(self):
+        """Write the cache to disk."""
+        try:
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(
+                json.dumps({'version': CACHE_VERSION, 'results': self.results})
+            )
+            os.replace(tmp, self.path)
+        except Exception:
+            lp_logger.exception('Unable to write grading cache %s', self.path)
+
+
+def fingerprint_tasks(tasks: Iterable[Task]):
+    """
+    Fingerprint each of the given tasks, tasks that cannot be fingerprinted are
+    left out and will always be run.
+
+    :return: A dictionary mapping each task to its fingerprint
+    """
+    from learn_python.tests.tests import tasks as all_tasks
+    fingerprints = {}
+    for task in tasks:
+        try:
+            fingerprints[task] = task_fingerprint(task, all_tasks.get(task.module, {}))
+        except Exception:
+            lp_logger.exception('Unable to fingerprint task %s::%s', task.module, task.name)
+    return fingerprints
@@ -0,0 +1,160 @@
+import gc
+import math
+import statistics
+from copy import deepcopy
+from time import perf_counter
+from typing import Callable, List, Optional, Sequence
+
+
+# samples further than this many (scaled) median absolute deviations from the
+# median are outliers - usually the garbage collector or another process
+OUTLIER_THRESHOLD = 3.5
+
+# each measurement is made from this many samples
+REPEAT = 7
+
+# a more complex curve must fit this much better than a simpler one to be chosen
+PARSIMONY = 0.5
+
+# run times shorter than this many seconds are mostly timer overhead
+RESOLUTION = 1e-5
+
+
+class Complexity:
+    """
+    A complexity class a function's run time can grow in, with the size of its
+    input.
+
+    :param notation: The big-O notation for the class, e.g. O(n²)
+    :param description: A word or two for the class, e.g. quadratic
+    :param curve: The growth curve of the class as a function of the input size
+    """
+
+    notation: str
+    description: str
+    curve: Callable[[float], float]
+
+    def __init__(self, notation, description, curve):
+        self.notation = notation
+        self.description = description
+        self.curve = curve
+
+    def __str__(self):
+        return f'{self.notation} ({self.description})'
+
+    def __repr__(self):
+        return f'Complexity({self.notation})'
+
+
+# simplest first
+CONSTANT = Complexity('O(1)', 'constant', lambda n: 0)
+LOGARITHMIC = Complexity('O(log n)', 'logarithmic', lambda n: math.log(n))
+LINEAR = Complexity('O(n)', 'linear', lambda n: n)
+LINEARITHMIC = Complexity('O(n log n)', 'linearithmic', lambda n: n * math.log(n))
+QUADRATIC = Complexity('O(n²)', 'quadratic', lambda n: n ** 2)
+CUBIC = Complexity('O(n³)', 'cubic', lambda n: n ** 3)
+
+COMPLEXITIES = [CONSTANT, LOGARITHMIC, LINEAR, LINEARITHMIC, QUADRATIC, CUBIC]
+
+
+def reject_outliers(samples: Sequence[float], threshold: float = OUTLIER_THRESHOLD) -> List[float]:
+    """
+    Remove the outliers from the samples using their modified z-scores, which are
+    based on the median and median absolute deviation so the outliers themselves
+    cannot mask each other.
+    """
+    median = statistics.median(samples)
+    deviation = statistics.median([abs(sample - median) for sample in samples])
+    if deviation == 0:
+        return [sample for sample in samples if sample == median] or list(samples)
+    return [
+        sample for sample in samples
+        if 0.6745 * abs(sample - median) / deviation <= threshold
+    ]
+
+
+def measure_time(
+    function: Callable,
+    args: tuple,
+    repeat: int = REPEAT,
+    limit: Optional[float] = None
+) -> float:
+    """
+    Time the given function called with the given arguments several times. Each call
+    gets its own copy of the arguments in case the function modifies them. Like
+    timeit, garbage collection is disabled while the function runs. An extra first
+    call warms up caches and is not counted.
+
+    :param function: The function to time
+    :param args: The arguments to call it with
+    :param repeat: The number of calls to measure
+    :param limit: Give up as soon as a call takes longer than this many seconds
+    :return: The mean run time in seconds of the calls that were not outliers, or
+        the time of the call that went over the limit
+    """
+    samples = []
+    collecting = gc.isenabled()
+    try:
+        for call in range(repeat + 1):
+            call_args = deepcopy(args)
+            gc.disable()
+            start = perf_counter()
+            function(*call_args)
+            elapsed = perf_counter() - start
+            if collecting:
+                gc.enable()
+            if limit is not None and elapsed > limit:
+                return elapsed
+            if call:
+                samples.append(elapsed)
+    finally:
+        if collecting:
+            gc.enable()
+    inliers = reject_outliers(samples)
+    return sum(inliers) / len(inliers)
+
+
+def fit(sizes: Sequence[int], values: Sequence[float], floor: float = 0) -> Complexity:
+    """
+    Classify the growth of the values with the input sizes. Each complexity class is
+    fit to the values by least squares as a * curve(n) + b, weighted so that errors
+    are relative to the values, and the class with the smallest error wins - unless
+    a simpler class fits almost as well.
+
+    :param sizes: The input sizes
+    :param values: The measurement at each size
+    :param floor: Measurements that never reach this value are noise - constant
+    """
+    if not values or max(values) <= floor:
+        return CONSTANT
+    relative_floor = max(floor, max(values) * 1e-3)
+    weights = [1 / max(value, relative_floor) ** 2 for value in values]
+    best, best_error = None, math.inf
+    for complexity in COMPLEXITIES:
+        curve = [complexity.curve(size) for size in sizes]
+        a, b = weighted_line(curve, values, weights)
+        if a < 0:  # shrinking curves are not meaningful
+            continue
+        error = sum(
+            weight * (value - (a * x + b)) ** 2
+            for x, value, weight in zip(curve, values, weights)
+        )
+        if best is None or error < best_error * PARSIMONY:
+            best, best_error = complexity, error
+    return best
+
+
+def weighted_line(xs: Sequence[float], ys: Sequence[float], weights: Sequence[float]):
+    """
+    Fit y = a * x + b by weighted least squares.
+
+    :return: The (a, b) 2-tuple - a is 0 if the xs are all the same
+    """
+    total = sum(weights)
+    x_mean = sum(w * x for x, w in zip(xs, weights)) / total
+    y_mean = sum(w * y for y, w in zip(ys, weights)) / total
+    spread = sum(w * (x - x_mean) ** 2 for x, w in zip(xs, weights))
+    if spread == 0:
+        return 0, y_mean
+    a = sum(w * (x - x_mean) * (y - y_mean) for x, y, w in zip(xs, ys, weights)) / spread
+    return a, y_mean - a * x_mean
@@ -7,8 +7,11 @@ import ast
 import inspect
 from learn_python.tests.utils import *
 from learn_python.tests.tasks import *
+from learn_python.tests.performance import assert_performance
+from learn_python.tests.rules import Requirements
 from functools import partial
 import glob
+import random
 import re
 
 
@@ -26,8 +29,12 @@ def lists_compare(list1, list2):
     return compare_floats(sorted(list1), sorted(list2))
 
 
+def get_task_module_name(task_name, number):
+    return f'learn_python.module2_basics.gateway2.task{number}_{task_name}'
+
+
 def get_task_module(task_name, number=None):
-    module_import = f'learn_python.module2_basics.gateway2.task{number}_{task_name}'
+    module_import = get_task_module_name(task_name, number)
     try:
         return module_import, importlib.import_module(module_import)
     except (ImportError, ModuleNotFoundError):
@@ -41,7 +48,7 @@ def import_task(task_name, number=None):
         if not task:
             return None
         number = task.number
-    return import_string(f'{get_task_module(task_name, number)[0]}.{task_name}')
+    return import_string(f'{get_task_module_name(task_name, number)}.{task_name}')
 
 
 for task in glob.glob(str(gateway2_dir / 'task*.py')):
@@ -50,15 +57,15 @@ for task in glob.glob(str(gateway2_dir / 'task*.py')):
     if mtch:
         task_name = mtch.groupdict()['name']
         number = int(mtch.groupdict()['number'])
-        mod_str, task_mod = get_task_module(task_name, number)
+        # the task code is imported lazily, when it is first needed
         task = Task(
             number=number,
             name=task_name,
             path=task_path,
             test=f'learn_python.tests.module2.test_gateway2_{task_name}',
-            function=import_task(task_name, number) or task_name,
+            function=task_name,
             module='module2',
-            modules=[task_mod or mod_str]
+            modules=[get_task_module_name(task_name, number)]
         )
         while len(module2_tasks) <= task.number:
             module2_tasks.append(None)
@@ -66,16 +73,32 @@ for task in glob.glob(str(gateway2_dir / 'task*.py')):
         task_map[task.name] = task
 
 
+# parse all of the task code once up front, so the skip conditions below only need
+# to check whether each task file has changed
+scan_unimplemented_directory(gateway2_dir, 'task*.py')
+
+
 def unimplemented(task_name) -> bool:
+    """
+    True if the named task has not been implemented yet. Tests use this in string
+    skipif conditions so that it is evaluated when each test runs, against the
+    current task code, rather than once when this module is imported. The task
+    code is not imported, see scan_unimplemented(). If it cannot be parsed the
+    test runs so that it reports the error.
+    """
     task = task_map.get(task_name, None)
     if task:
-        imported_task = import_task(task.name)
-        if imported_task:
-            return is_unimplemented(imported_task)
+        try:
+            functions = scan_unimplemented(task.path)
+        except OSError:
+            return True
+        if functions is None:
+            return False
+        return functions.get(task.name, True)
     return True
 
 
-@pytest.mark.skipif(unimplemented('is_even'), reason='is_even not implemented yet.')
+@pytest.mark.skipif("unimplemented('is_even')", reason='is_even not implemented yet.')
 def test_gateway2_is_even():
     gateway_is_even = import_task('is_even')
 
@@ -89,7 +112,12 @@ def test_gateway2_is_even():
         assert gateway_is_even(val) == is_even(val), f'is_even({val}) should return {is_even(val)}, but returns {gateway_is_even(val)}'
 
 
-@pytest.mark.skipif(unimplemented('is_odd'), reason='is_odd not implemented yet.')
+is_odd_requirements = Requirements(
+    calls=['is_even']
+)
+
+
+@pytest.mark.skipif("unimplemented('is_odd')", reason='is_odd not implemented yet.')
 def test_gateway2_is_odd():
     try:
         is_even = import_task('is_even')
@@ -107,10 +135,10 @@ def test_gateway2_is_odd():
     for val in range(-1000, 0):
         assert gateway_is_odd(val) == is_odd(val), f'is_odd({val}) should return {is_odd(val)}, but returns {gateway_is_odd(val)}'
 
-    assert is_function_called(gateway_is_odd, is_even), f'is_odd() does not call is_even() - you must use is_even() to implement is_odd()'
+    is_odd_requirements.check(gateway_is_odd)
 
 
-@pytest.mark.skipif(unimplemented('is_even_safe'), reason='is_even_safe not implemented yet.')
+@pytest.mark.skipif("unimplemented('is_even_safe')", reason='is_even_safe not implemented yet.')
 def test_gateway2_is_even_safe():
     is_even_safe = import_task('is_even_safe')
 
@@ -126,7 +154,13 @@ def test_gateway2_is_even_safe():
     assert is_even_safe(None) is None, f'is_even_safe(None) should return None, but returns {is_even_safe(None)}'
 
 
-@pytest.mark.skipif(unimplemented('is_even_safe_ternary'), reason='is_even_safe_ternary not implemented yet.')
+is_even_safe_ternary_requirements = Requirements(
+    statements=1,
+    require=[ast.IfExp]
+)
+
+
+@pytest.mark.skipif("unimplemented('is_even_safe_ternary')", reason='is_even_safe_ternary not implemented yet.')
 def test_gateway2_is_even_safe_ternary():
     is_even_safe_ternary = import_task('is_even_safe_ternary')
 
@@ -141,8 +175,7 @@ def test_gateway2_is_even_safe_ternary():
 
     assert is_even_safe_ternary(None) is None, f'is_even_safe_ternary(None) should return None, but returns {is_even_safe_ternary(None)}'
 
-    assert has_ternary(is_even_safe_ternary), f'is_even_safe_ternary() does not use a ternary expression'
-    assert num_statements(is_even_safe_ternary) == 2 and has_docstring(is_even_safe_ternary) or num_statements(is_even_safe_ternary) == 1, 'is_even_safe_ternary() should only require one statement, or one statement plus a docstring'
+    is_even_safe_ternary_requirements.check(is_even_safe_ternary)
 
 
 def check_logic_play(logic_play):
@@ -182,23 +215,33 @@ def check_logic_play(logic_play):
             assert logic_play(x, y) is None, f'{logic_play.__name__}({x}, {y}) should return None, but returns {logic_play(x, y)}'
 
 
-@pytest.mark.skipif(unimplemented('logic_play'), reason='logic_play not implemented yet.')
+logic_play_requirements = Requirements(
+    require=[ast.And]
+)
+
+
+@pytest.mark.skipif("unimplemented('logic_play')", reason='logic_play not implemented yet.')
 def test_gateway2_logic_play():
     logic_play = import_task('logic_play')
     check_logic_play(logic_play)
-    assert has_and(logic_play), 'logic_play() does not use the logical operator "and"'
+    logic_play_requirements.check(logic_play)
+
+
+logic_play2_requirements = Requirements(
+    max_statements=5,
+    forbid=[ast.BoolOp],
+    max_calls=3
+)
 
 
-@pytest.mark.skipif(unimplemented('logic_play2'), reason='logic_play2 not implemented yet.')
+@pytest.mark.skipif("unimplemented('logic_play2')", reason='logic_play2 not implemented yet.')
 def test_gateway2_logic_play2():
     logic_play2 = import_task('logic_play2')
     check_logic_play(logic_play2)
-    assert not has_logical_operator(logic_play2), 'logic_play2() is not allowed to use any logical operators!'
-    assert num_statements(logic_play2) <= 5 or has_docstring(logic_play2) and num_statements(logic_play2) <= 6, 'logic_play2() should only require 5 statements, or 5 statements plus a docstring'
-    assert count_calls(logic_play2) <= 3, 'logic_play2() may only call another function a maximum of 3 times'
+    logic_play2_requirements.check(logic_play2)
     
 
-@pytest.mark.skipif(unimplemented('default_args'), reason='default_args not implemented yet.')
+@pytest.mark.skipif("unimplemented('default_args')", reason='default_args not implemented yet.')
 def test_gateway2_default_args():
     default_args = import_task('default_args')
 
@@ -243,7 +286,12 @@ def test_gateway2_default_args():
     assert default_args(**test4) == (True, True, True, False), f'default_args({call_str(test4)}) should return [True, True, True, False], but returns {default_args(**test4)}'
 
 
-@pytest.mark.skipif(unimplemented('get_delegate'), reason='get_delegate not implemented yet.')
+get_delegate_requirements = Requirements(
+    require=[ast.FunctionDef]
+)
+
+
+@pytest.mark.skipif("unimplemented('get_delegate')", reason='get_delegate not implemented yet.')
 def test_gateway2_get_delegate():
     get_delegate = import_task('get_delegate')
     delegate = get_delegate(None)
@@ -251,10 +299,15 @@ def test_gateway2_get_delegate():
     def six():
         return 6
     assert get_delegate(six)() == 6, f'get_delegate(function)() should return function(), but returns {get_delegate(six)()}'
-    assert has_func_definition(get_delegate), f'You must define the default delegate function inside get_delegate()'
+    get_delegate_requirements.check(get_delegate)
+
+
+is_close_requirements = Requirements(
+    forbid_calls=['isclose']
+)
 
 
-@pytest.mark.skipif( unimplemented('is_close'), reason='is_close not implemented yet.')
+@pytest.mark.skipif("unimplemented('is_close')", reason='is_close not implemented yet.')
 def test_gateway2_is_close():
     is_close = import_task('is_close')
 
@@ -269,10 +322,10 @@ def test_gateway2_is_close():
     assert is_close(0.0, 1e-10, 1e-11) is False, f'is_close(0.0, 1e-10, 1e-11) should return False, but returns {is_close(0, 1e-11, 1e-11)}'
     assert is_close(0.0, 1e-12, 1e-11) is True, f'is_close(0.0, 1e-12, 1e-11) should return True, but returns {is_close(0, 1e-12, 1e-11)}'
 
-    assert not is_function_called(is_close, 'isclose'), f'isclose() should not call math.isclose()'
+    is_close_requirements.check(is_close)
 
 
-@pytest.mark.skipif(unimplemented('normal_distribution'), reason="normal_distribution not implemented yet.")
+@pytest.mark.skipif("unimplemented('normal_distribution')", reason="normal_distribution not implemented yet.")
 def test_gateway2_normal_distribution():
 
     import numpy as np
@@ -342,7 +395,7 @@ def test_gateway2_normal_distribution():
         pytest.fail("normal_distribution plots are not correct.")
 
 
-@pytest.mark.skipif(unimplemented('type_divide'), reason='divide not implemented yet.')
+@pytest.mark.skipif("unimplemented('type_divide')", reason='divide not implemented yet.')
 def test_gateway2_type_divide():
     type_divide = import_task('type_divide')
     import math
@@ -361,7 +414,13 @@ def test_gateway2_type_divide():
 
     assert math.isclose(type_divide(2.5, 1e-300), 2.5e300), f'type_divide(2.5, 1e-300) should return 2.5e300, but returns {type_divide(2.5, 1e-300)}'
 
-@pytest.mark.skipif(unimplemented('get_decimal'), reason='get_decimal not implemented yet.')
+
+get_decimal_requirements = Requirements(
+    statements=1
+)
+
+
+@pytest.mark.skipif("unimplemented('get_decimal')", reason='get_decimal not implemented yet.')
 def test_gateway2_get_decimal():
     get_decimal = import_task('get_decimal')
     from math import isclose
@@ -375,10 +434,10 @@ def test_gateway2_get_decimal():
     assert isclose(get_decimal(-123.126662), -0.126662), f'get_decimal(-123.126662) should return -0.126662, but returns {get_decimal(-123.126662)}'
     assert isclose(get_decimal(8), 0.0), f'get_decimal(8) should return 0.0, but returns {get_decimal(8)}'
     assert type(get_decimal(8)) is float, f'get_decimal(8) should return a float, but returns {type(get_decimal(8))}'
-    assert num_statements(get_decimal) == 1 or (num_statements(get_decimal) == 2 and has_docstring(get_decimal)), 'get_decimal() should only require one statement'
+    get_decimal_requirements.check(get_decimal)
 
 
-@pytest.mark.skipif(unimplemented('get_element'), reason='get_element not implemented yet.')
+@pytest.mark.skipif("unimplemented('get_element')", reason='get_element not implemented yet.')
 def test_gateway2_get_element():
     get_element = import_task('get_element')
 
@@ -406,7 +465,7 @@ def test_gateway2_get_element():
     assert get_element(test_list, -26) is None, f'get_element({test_list}, -26) should return None but returned {get_element(test_list, -26)}'
 
 
-@pytest.mark.skipif(unimplemented('split'), reason='split not implemented yet.')
+@pytest.mark.skipif("unimplemented('split')", reason='split not implemented yet.')
 def test_gateway2_split():
     split = import_task('split')
 
@@ -427,7 +486,7 @@ def test_gateway2_split():
     assert split(test_list, -5) == ([], [0, 1, 2, 3, 4]), f'split({test_list}, -5) should return ([], [0, 1, 2, 3, 4]) but returned {split(test_list, -5)}'
     
 
-@pytest.mark.skipif(unimplemented('decimate'), reason='decimate not implemented yet.')
+@pytest.mark.skipif("unimplemented('decimate')", reason='decimate not implemented yet.')
 def test_gateway2_decimate():
     from learn_python.tests.utils import float_range
     decimate = import_task('decimate')
@@ -447,7 +506,7 @@ def test_gateway2_decimate():
 
 
 
-@pytest.mark.skipif(unimplemented('combine'), reason='combine not implemented yet.')
+@pytest.mark.skipif("unimplemented('combine')", reason='combine not implemented yet.')
 def test_gateway2_combine():
     combine = import_task('combine')
     from learn_python.tests.utils import float_range
@@ -459,7 +518,12 @@ def test_gateway2_combine():
         assert combine(list1, list2) == expected, f'combine({list1}, {list2}) should return {expected}, but returns {combine(list1, list2)}'
 
 
-@pytest.mark.skipif(unimplemented('split_name'), reason='split_name not implemented yet.')
+split_name_requirements = Requirements(
+    calls=['split', 'title', 'join']
+)
+
+
+@pytest.mark.skipif("unimplemented('split_name')", reason='split_name not implemented yet.')
 def test_gateway2_split_name():
     split_name = import_task('split_name')
     
@@ -468,12 +532,16 @@ def test_gateway2_split_name():
     assert split_name('brian') == ('Brian', None, None), f'split_name("brian") should return ("Brian", None, None), but returns {split_name("brian")}'
     assert split_name('') == (None, None, None), f'split_name("") should return (None, None, None), but returns {split_name("")}'
 
-    assert is_function_called(split_name, 'split'), 'split_name() must call str.split()'
-    assert is_function_called(split_name, 'title'), 'split_name() must call str.title()'
-    assert is_function_called(split_name, 'join'), 'split_name() must call str.join()'
+    split_name_requirements.check(split_name)
+
 
+label_names_requirements = Requirements(
+    require=[ast.JoinedStr],
+    calls=['append', 'join']
+)
 
-@pytest.mark.skipif(unimplemented('label_names'), reason='label_names not implemented yet.')
+
+@pytest.mark.skipif("unimplemented('label_names')", reason='label_names not implemented yet.')
 def test_gateway2_label_names():
     label_names = import_task('label_names')
     
@@ -484,12 +552,17 @@ def test_gateway2_label_names():
     assert label_names('', '', '') == '', f'label_names("", "", "") should return "", but returns {label_names("", "", "")}'
     assert label_names(last='Kohan') == 'last=Kohan', f'label_names(last="Kohan") should return "last=Kohan", but returns {label_names(last="Kohan")}'
 
-    assert is_function_called(label_names, 'append'), 'label_names() must call list.append()'
-    assert has_statement(label_names, ast.JoinedStr), 'label_names() must use f-strings'
-    assert is_function_called(label_names, 'join'), 'label_names() must call str.join()'
+    label_names_requirements.check(label_names)
+
+
+format_constant_requirements = Requirements(
+    statements=3,
+    calls=['get_decimal', 'round'],
+    format_spec=False
+)
 
 
-@pytest.mark.skipif(unimplemented('format_constant'), reason='format_constant not implemented yet.')
+@pytest.mark.skipif("unimplemented('format_constant')", reason='format_constant not implemented yet.')
 def test_gateway2_format_constant():
     format_constant = import_task('format_constant')
     get_decimal = import_task('get_decimal')
@@ -503,13 +576,18 @@ def test_gateway2_format_constant():
     assert result_str == "Kaprekar's Constant       6174", f'format_constant("Kaprekar\'s Constant", 6174, line_length=30, decimals=0) should return "Kaprekar\'s Constant       6174", but returns {result_str}'
     result_str = format_constant("Kaprekar's Constant", 6174, line_length=30)
     assert result_str == "Kaprekar's Constant  6174.0000", f'format_constant("Kaprekar\'s Constant", 6174, line_length=30) should return "Kaprekar\'s Constant       6174.0000", but returns {result_str}'
-    assert is_function_called(format_constant, get_decimal), 'format_constant() must call get_decimal()'
-    assert is_function_called(format_constant, round), 'format_constant() must call round()'
-    assert not has_format_specifier(format_constant), f'format_constant() cannot use an f-string format specifier: {has_format_specifier(format_constant)}' 
-    assert num_statements(format_constant) == 3 or (num_statements(format_constant) == 4 and has_docstring(format_constant)), 'format_constant() should only require 3 statements'
+    format_constant_requirements.check(format_constant)
+
+
+format_constant2_requirements = Requirements(
+    statements=1,
+    forbid=[ast.Mult],
+    forbid_calls=['get_decimal', 'format_constant'],
+    format_spec=True
+)
 
 
-@pytest.mark.skipif(unimplemented('format_constant2'), reason='format_constant2 not implemented yet.')
+@pytest.mark.skipif("unimplemented('format_constant2')", reason='format_constant2 not implemented yet.')
 def test_gateway2_format_constant2():
     format_constant2 = import_task('format_constant2')
 
@@ -522,14 +600,10 @@ def test_gateway2_format_constant2():
     result_str = format_constant2("Kaprekar's Constant", 6174, line_length=30)
     assert result_str == "Kaprekar's Constant  6174.0000", f'format_constant2("Kaprekar\'s Constant", 6174, line_length=30) should return "Kaprekar\'s Constant       6174.0000", but returns {result_str}'
     
-    assert not is_function_called(format_constant2, 'get_decimal'), 'format_constant2() must not call get_decimal()'
-    assert has_format_specifier(format_constant2), f'format_constant2() must use f-string format specifiers.' 
-    assert not has_statement(format_constant2, ast.Mult), 'format_constant2() must not use *'
-    assert not is_function_called(format_constant2, 'format_constant'), 'format_constant2() must not call format_constant()'
-    assert num_statements(format_constant2) == 1 or (num_statements(format_constant2) == 2 and has_docstring(format_constant2)), 'format_constant2() should only require 1 statement'
+    format_constant2_requirements.check(format_constant2)
 
 
-@pytest.mark.skipif(unimplemented('ends_with'), reason='ends_with not implemented yet.')
+@pytest.mark.skipif("unimplemented('ends_with')", reason='ends_with not implemented yet.')
 def test_gateway2_ends_with():
     ends_with = import_task('ends_with')
     
@@ -548,8 +622,7 @@ def test_gateway2_ends_with():
     assert not ends_with('anna maria', '  MARIA'), f'ends_with("anna maria  ", "  MARIA") should return False, but returns: {ends_with("anna maria  ", "  MARIA")}'
 
 
-@pytest.mark.skipif(
-    unimplemented('are_same_object'), reason="are_same_object not implemented yet."
+@pytest.mark.skipif("unimplemented('are_same_object')", reason="are_same_object not implemented yet."
 )
 def test_gateway2_are_same_object():
     are_same_object = import_task('are_same_object')
@@ -574,7 +647,13 @@ def test_gateway2_are_same_object():
     assert are_same_object(five, six) is True, f'are_same_object(five, six) after five = six, should return True, but returns {are_same_object(five, six)}'
 
 
-@pytest.mark.skipif(unimplemented('list_difference'), reason='list_difference not implemented yet.')
+list_difference_requirements = Requirements(
+    statements=1,
+    calls=['set']
+)
+
+
+@pytest.mark.skipif("unimplemented('list_difference')", reason='list_difference not implemented yet.')
 def test_gateway2_list_difference():
     list_difference = import_task('list_difference')
     from learn_python.tests.utils import float_range, compare_floats
@@ -587,11 +666,28 @@ def test_gateway2_list_difference():
 
     assert lists_compare(list_difference(list1, list2), list1[:list1.index(0)]), f'list_difference({list1}, {list2}) should return {list1[:list1.index(0)]}, but returns {list_difference(list1, list2)}'
     assert lists_compare(list_difference(list3, list4), list3[len(list3)//2:]), f'list_difference({list3}, {list4}) should return {list3[len(list3)//2:]}, but returns {list_difference(list3, list4)}'
-    assert num_statements(list_difference) == 1 or (num_statements(list_difference) == 2 and has_docstring(list_difference)), 'list_difference() should only require 1 statement'
-    assert is_function_called(list_difference, set), f'list_difference() must call set()'
+    list_difference_requirements.check(list_difference)
+
+
+def deduplicate_reference(sequence, preserve_order=False):
+    return list(dict.fromkeys(sequence)) if preserve_order else list(set(sequence))
+
 
+def deduplicate_inputs(size):
+    rand = random.Random(size)
+    return [rand.randrange(size // 2) for _ in range(size)], False
 
-@pytest.mark.skipif(unimplemented('deduplicate'), reason='deduplicate not implemented yet.')
+
+def deduplicate_ordered_inputs(size):
+    return deduplicate_inputs(size)[0], True
+
+
+deduplicate_requirements = Requirements(
+    statements=1
+)
+
+
+@pytest.mark.skipif("unimplemented('deduplicate')", reason='deduplicate not implemented yet.')
 def test_gateway2_deduplicate():
     deduplicate = import_task('deduplicate')
     from learn_python.tests.utils import float_range
@@ -603,11 +699,13 @@ def test_gateway2_deduplicate():
     de_duplicated = deduplicate(list1, preserve_order=True)
     assert type(de_duplicated) is list, f'deduplicate({list1}, preserve_order=True) should return a list, but returns {type(de_duplicated)}'
     assert de_duplicated == [-4, 4, 1, 2, 3], f'deduplicate({list1}) should return [-4, 4, 1, 2, 3], but returns {de_duplicated}'
-    assert num_statements(deduplicate) == 1 or (num_statements(deduplicate) == 2 and has_docstring(deduplicate)), 'deduplicate() should only require 1 statement'
+    deduplicate_requirements.check(deduplicate)
+    assert_performance(deduplicate, deduplicate_reference, deduplicate_inputs)
+    assert_performance(deduplicate, deduplicate_reference, deduplicate_ordered_inputs)
 
 
 
-@pytest.mark.skipif(unimplemented('separate'), reason='separate not implemented yet.')
+@pytest.mark.skipif("unimplemented('separate')", reason='separate not implemented yet.')
 def test_gateway2_separate():
     separate = import_task('separate')
     from learn_python.tests.utils import float_range
@@ -619,7 +717,12 @@ def test_gateway2_separate():
         assert separate(inpt) == expected, f'separate({inpt}) should return {expected}, but returns {separate(inpt)}'
 
 
-@pytest.mark.skipif(unimplemented('get_slices'), reason='get_slices not implemented yet.')
+get_slices_requirements = Requirements(
+    require=[ast.Slice, ast.For, ast.AugAssign]
+)
+
+
+@pytest.mark.skipif("unimplemented('get_slices')", reason='get_slices not implemented yet.')
 def test_gateway2_get_slices():
     get_slices = import_task('get_slices')
 
@@ -636,13 +739,31 @@ def test_gateway2_get_slices():
     result = [3, 1, 2, 3, 0, 1, 2, 3, 4]
     assert get_slices(test_list, slices) == result, f'get_slices({test_list}, {slices}) should return {result} but returns {get_slices(test_list, slices)}'
 
-    assert has_slice(get_slices), 'get_slices() must use a slice expression'
-    
-    assert has_for_loop(get_slices), 'get_slices() must use a for loop'
-    assert has_statement(get_slices, ast.AugAssign), 'get_slices() must use the += operator'
+    get_slices_requirements.check(get_slices)
+
+
+def list_intersection_reference(list1, list2):
+    in1, in2 = set(list1), set(list2)
+    return [elem for elem in list1 if elem in in2] + [elem for elem in list2 if elem in in1]
 
 
-@pytest.mark.skipif(unimplemented('list_intersection'), reason='list_intersection not implemented yet.')
+def list_intersection2_reference(list1, list2):
+    # the single statement list_intersection2 must be written as searches the lists
+    return [*[elem for elem in list1 if elem in list2], *[elem for elem in list2 if elem in list1]]
+
+
+def list_intersection_inputs(size):
+    rand = random.Random(size)
+    return [rand.randrange(size) for _ in range(size)], [rand.randrange(size) for _ in range(size)]
+
+
+list_intersection_requirements = Requirements(
+    require=[ast.For],
+    forbid_calls=['set']
+)
+
+
+@pytest.mark.skipif("unimplemented('list_intersection')", reason='list_intersection not implemented yet.')
 def test_gateway2_list_intersection():
     list_intersection = import_task('list_intersection')
     from learn_python.tests.utils import float_range, compare_floats
@@ -656,8 +777,8 @@ def test_gateway2_list_intersection():
     expected = [None, 0, '', None, 4.5, None, 0, 4.5, '']
     assert list_intersection(list3, list4) == expected, f'list_intersection({list3}, {list4}) should return {expected} but returned {list_intersection(list3, list4)}'
 
-    assert not is_function_called(list_intersection, set), f'list_intersection() must not call set()'
-    assert has_for_loop(list_intersection), f'list_intersection() must use a for loop'
+    list_intersection_requirements.check(list_intersection)
+    assert_performance(list_intersection, list_intersection_reference, list_intersection_inputs, sizes=(100, 200, 400, 800))
 
 
 def check_is_fibonacci(numbers):
@@ -672,7 +793,23 @@ def check_is_fibonacci(numbers):
     return True
     
 
-@pytest.mark.skipif(unimplemented('fibonacci'), reason='fibonacci not implemented yet.')
+def fibonacci_reference(length):
+    numbers = [0, 1][:length]
+    while len(numbers) < length:
+        numbers.append(numbers[-1] + numbers[-2])
+    return numbers
+
+
+def fibonacci_inputs(size):
+    return (size,)
+
+
+fibonacci_requirements = Requirements(
+    require=[ast.While]
+)
+
+
+@pytest.mark.skipif("unimplemented('fibonacci')", reason='fibonacci not implemented yet.')
 def test_gateway2_fibonacci():
     from learn_python.tests.utils import float_range, compare_floats
 
@@ -690,7 +827,8 @@ def test_gateway2_fibonacci():
         assert len(numbers) == length, f'fibonacci({length}) should return a list of length {length}, but returns {len(numbers)}'
         assert check_is_fibonacci(numbers), f'fibonacci({length}) == {numbers} is not a fibonacci sequence'
 
-    assert has_while_loop(fibonacci), 'fibonacci() does not use a while loop!'
+    fibonacci_requirements.check(fibonacci)
+    assert_performance(fibonacci, fibonacci_reference, fibonacci_inputs)
 
 
 def is_identity(matrix, size=None):
@@ -711,7 +849,12 @@ def is_identity(matrix, size=None):
     return True
 
 
-@pytest.mark.skipif(unimplemented('identity_matrix'), reason="identity_matrix not implemented yet.")
+identity_matrix_requirements = Requirements(
+    require=[ast.For]
+)
+
+
+@pytest.mark.skipif("unimplemented('identity_matrix')", reason="identity_matrix not implemented yet.")
 def test_gateway2_identity_matrix():
     identity_matrix = import_task('identity_matrix')
 
@@ -722,10 +865,10 @@ def test_gateway2_identity_matrix():
     assert is_identity(identity_matrix(3), 3), f'identity_matrix(3) is not correct: {pformat(identity_matrix(3))}'
     assert is_identity(identity_matrix(4), 4), f'identity_matrix(4) is not correct: {pformat(identity_matrix(4))}'
     assert is_identity(identity_matrix(26), 26), f'identity_matrix(26) is not correct: {pformat(identity_matrix(26))}'
-    assert has_for_loop(identity_matrix), 'identity_matrix() does not use any for loops'
+    identity_matrix_requirements.check(identity_matrix)
 
 
-@pytest.mark.skipif(unimplemented('is_identity'), reason="is_identity not implemented yet.")
+@pytest.mark.skipif("unimplemented('is_identity')", reason="is_identity not implemented yet.")
 def test_gateway2_is_identity():
     is_identity = import_task('is_identity')
 
@@ -747,7 +890,14 @@ def test_gateway2_is_identity():
     assert is_identity([[1, 0, 0], [0, 0, 1], [0, 1, 0]]) is False, f'is_identity([[1, 0, 0], [0, 0, 1], [0, 1, 0]]) should return True, but returns {is_identity([[1, 0, 0], [0, 0, 1], [0, 1, 0]])}'
 
 
-@pytest.mark.skipif(unimplemented('identity_matrix2'),  reason="identity_matrix2 not implemented yet.")
+identity_matrix2_requirements = Requirements(
+    statements=1,
+    require=[ast.ListComp, ast.IfExp],
+    forbid_calls=['identity_matrix']
+)
+
+
+@pytest.mark.skipif("unimplemented('identity_matrix2')",  reason="identity_matrix2 not implemented yet.")
 def test_gateway2_identity_matrix2():
     identity_matrix2 = import_task('identity_matrix2')
 
@@ -759,17 +909,15 @@ def test_gateway2_identity_matrix2():
     assert is_identity(identity_matrix2(4), 4), f'identity_matrix2(4) is not correct: {pformat(identity_matrix2(4))}'
     assert is_identity(identity_matrix2(26), 26), f'identity_matrix2(26) is not correct: {pformat(identity_matrix2(26))}'
 
-    assert num_statements(identity_matrix2) == 2 and has_docstring(identity_matrix2) or num_statements(identity_matrix2) == 1, 'identity_matrix2() should only require one statement, or one statement plus a docstring'
-    assert has_list_comprehension(identity_matrix2), 'identity_matrix2() does not use a list comprehension'
-    assert has_ternary(identity_matrix2), 'identity_matrix2() does not use a ternary if condition'
-    try:
-        from learn_python.module2_basics.gateway2.task0_is_even import identity_matrix
-        assert not is_function_called(identity_matrix2, identity_matrix), 'identity_matrix2() should not call identity_matrix()'
-    except ImportError:
-        pass
+    identity_matrix2_requirements.check(identity_matrix2)
+
+
+fibonacci_gr_requirements = Requirements(
+    require=[ast.Break]
+)
 
 
-@pytest.mark.skipif(unimplemented('fibonacci_gr'), reason='fibonacci_gr not implemented yet.')
+@pytest.mark.skipif("unimplemented('fibonacci_gr')", reason='fibonacci_gr not implemented yet.')
 def test_gateway2_fibonacci_gr():
     fibonacci_gr = import_task('fibonacci_gr')
     from learn_python.tests.utils import float_range, compare_floats
@@ -780,10 +928,10 @@ def test_gateway2_fibonacci_gr():
         assert abs(numbers[-1] / numbers[-2] - ((1 + 5 ** 0.5) / 2)) < tol, f'fibonacci({tol:.2E}) produced {len(numbers)} numbers and did not reach the tolerance {tol:.2E}. Last ratio: {numbers[-1] / numbers[-2]:.12f}'
         assert abs(numbers[-2] / numbers[-3] - ((1 + 5 ** 0.5) / 2)) > tol,  f'fibonacci({tol:.2E}) produced {len(numbers)} numbers and went past the tolerance {tol:.2E}. Ratio before last: {numbers[-2] / numbers[-3]:.12f}'
 
-    assert has_break(fibonacci_gr), 'fibonacci() does not use a break statement!'
+    fibonacci_gr_requirements.check(fibonacci_gr)
 
 
-@pytest.mark.skipif(unimplemented('float_range'), reason='float_range not implemented yet.')
+@pytest.mark.skipif("unimplemented('float_range')", reason='float_range not implemented yet.')
 def test_gateway2_float_range():
     float_range = import_task('float_range')
 
@@ -795,7 +943,7 @@ def test_gateway2_float_range():
     assert compare_floats(float_range(1e-12, 2e-12, 2e-13), [1e-12, 1.2e-12, 1.4e-12, 1.6e-12, 1.8e-12, 2e-12]), f'float_range(1e-12, 2e-12, 2e-13) should return [1e-12, 1.2e-12, 1.4e-12, 1.6e-12, 1.8e-12, 2e-12], but returns {float_range(1e-12, 2e-12, 1e-13)}'
     assert compare_floats(float_range(0.099, 0.297, 0.099), [0.099, 0.198, 0.297]), f'float_range(0.099, 0.297, 0.099) should return [0.099, 0.198, 0.297], but returns {float_range(0.099, 0.297, 0.099)}'
 
-@pytest.mark.skipif(unimplemented('xy_values'), reason='xy_values not implemented yet.')
+@pytest.mark.skipif("unimplemented('xy_values')", reason='xy_values not implemented yet.')
 def test_gateway2_xy_values():
     xy_values = import_task('xy_values')
     from learn_python.tests.utils import float_range
@@ -832,7 +980,14 @@ def test_gateway2_xy_values():
             assert isclose(exp[1], ret[1]), f'xy_values(partial({pdf.__name__}, {kwargs}), start={x_min}, stop={x_max}, step={step})[{index}] y value == {ret[1]} when {exp[1]} was expected'
 
 
-@pytest.mark.skipif(unimplemented('approximate_integral'), reason='approximate_integral not implemented yet.')
+approximate_integral_requirements = Requirements(
+    statements=2,
+    counts={ast.ListComp: 2, ast.Slice: 2},
+    call_counts={'sum': 2}
+)
+
+
+@pytest.mark.skipif("unimplemented('approximate_integral')", reason='approximate_integral not implemented yet.')
 def test_gateway2_approximate_integral():
     approximate_integral = import_task('approximate_integral')
     from learn_python.tests.utils import float_range
@@ -859,13 +1014,10 @@ def test_gateway2_approximate_integral():
         xy = xy_values(partial(pdf, **kwargs), start=x_min, stop=x_max, step=step)
         area = approximate_integral(xy)
         assert isclose(area, 1.0, abs_tol=.01), f'approximate_integral() should return ~1.0 for any normal distribution, but returns {area}'
-        assert num_statements(approximate_integral) == 2 or (num_statements(approximate_integral) == 3 and has_docstring(approximate_integral)), 'approximate_integral() should only require 2 statements'
-        assert count_statements(approximate_integral, ast.ListComp) == 2, 'approximate_integral() implementation should use 2 list comprehensions'
-        assert count_statements(approximate_integral, ast.Slice) == 2, 'approximate_integral() implementation should use 2 slices'
-        assert count_calls(approximate_integral, sum) == 2, 'approximate_integral() implementation should use 2 calls to sum()'
+    approximate_integral_requirements.check(approximate_integral)
 
 
-@pytest.mark.skipif(unimplemented('add_to_list'), reason="add_to_list not implemented yet.")
+@pytest.mark.skipif("unimplemented('add_to_list')", reason="add_to_list not implemented yet.")
 def test_gateway2_add_to_list():
     add_to_list = import_task('add_to_list')
     my_list = [1, 2, 3]
@@ -877,7 +1029,7 @@ def test_gateway2_add_to_list():
     assert mutated is my_list, f'mutate=True should modify the list that was passed in'
 
 
-@pytest.mark.skipif(unimplemented('time_function'), reason="time_function not implemented yet.")
+@pytest.mark.skipif("unimplemented('time_function')", reason="time_function not implemented yet.")
 def test_gateway2_time_function():
     time_function = import_task('time_function')
     from time import perf_counter
@@ -894,7 +1046,15 @@ def test_gateway2_time_function():
     assert result == ((1, 2, 3), {'a': 4, 'b': 5, 'c': 6}), f'time_function(func_to_time, 1, 2, 3, a=4, b=5, c=6) should return ((1, 2, 3), {{\'a\': 4, \'b\': 5, \'c\': 6}}), but returns {result}'
 
 
-@pytest.mark.skipif(unimplemented('list_intersection2'), reason='list_intersection2 not implemented yet.')
+list_intersection2_requirements = Requirements(
+    statements=1,
+    require=[ast.ListComp],
+    forbid=[ast.For],
+    forbid_calls=['set']
+)
+
+
+@pytest.mark.skipif("unimplemented('list_intersection2')", reason='list_intersection2 not implemented yet.')
 def test_gateway2_list_intersection2():
     list_intersection2 = import_task('list_intersection2')
     from learn_python.tests.utils import float_range, compare_floats
@@ -908,10 +1068,8 @@ def test_gateway2_list_intersection2():
     expected = [None, 0, '', None, 4.5, None, 0, 4.5, '']
     assert list_intersection2(list3, list4) == expected, f'list_intersection2({list3}, {list4}) should return {expected} but returned {list_intersection2(list3, list4)}'
 
-    assert not is_function_called(list_intersection2, set), f'list_intersection2() must not call set()'
-    assert not has_for_loop(list_intersection2), f'list_intersection2() must not use a for loop'
-    assert num_statements(list_intersection2) == 2 and has_docstring(list_intersection2) or num_statements(list_intersection2) == 1, 'list_intersection2() should only require one statement, or one statement plus a docstring'
-    assert has_list_comprehension(list_intersection2), f'list_intersection2() does not use a list comprehension'
+    list_intersection2_requirements.check(list_intersection2)
+    assert_performance(list_intersection2, list_intersection2_reference, list_intersection_inputs, sizes=(100, 200, 400, 800))
 
 
 # test scenario
@@ -931,7 +1089,36 @@ ballots = [
     [3]
 ]
 
-@pytest.mark.skipif(unimplemented('ranked_choice'), reason="ranked_choice not implemented yet.")
+def ranked_choice_reference(candidates, ballots):
+    report = {'rounds': [], 'winner': None}
+    while True:
+        counts = {}
+        for ballot in ballots:
+            counts[ballot[0]] = counts.get(ballot[0], 0) + 1
+        ranking = sorted(counts.items(), key=lambda count: count[1], reverse=True)
+        votes = sum(counts.values())
+        report['rounds'].append({
+            'votes': votes,
+            'ranking': [(candidates[candidate], count) for candidate, count in ranking]
+        })
+        if ranking[0][1] > votes / 2:
+            report['winner'] = candidates[ranking[0][0]]
+            return report
+        eliminated = ranking[-1][0]
+        ballots = [
+            [candidate for candidate in ballot if candidate != eliminated]
+            for ballot in ballots
+        ]
+        ballots = [ballot for ballot in ballots if ballot]
+
+
+def ranked_choice_inputs(size):
+    rand = random.Random(size)
+    names = {idx: f'Candidate {idx}' for idx in range(8)}
+    return names, [rand.sample(list(names), rand.randint(1, len(names))) for _ in range(size)]
+
+
+@pytest.mark.skipif("unimplemented('ranked_choice')", reason="ranked_choice not implemented yet.")
 def test_gateway2_ranked_choice():
     ranked_choice = import_task('ranked_choice')
 
@@ -955,9 +1142,11 @@ def test_gateway2_ranked_choice():
     assert round2['ranking'] == round2_result, f"Round 2 ranking is not correct: {round2['ranking']} - expected: {round2_result}" 
     assert round3['ranking'] == round3_result, f"Round 3 ranking is not correct: {round3['ranking']} - expected: {round3_result}" 
 
+    assert_performance(ranked_choice, ranked_choice_reference, ranked_choice_inputs, sizes=(100, 200, 400, 800))
+
 
 
-@pytest.mark.skipif(unimplemented('ranked_choice') or unimplemented('print_report'), reason="ranked_choice and/or print_report not implemented yet.")
+@pytest.mark.skipif("unimplemented('ranked_choice') or unimplemented('print_report')", reason="ranked_choice and/or print_report not implemented yet.")
 def test_gateway2_print_report():
     ranked_choice, print_report = import_task('ranked_choice'), import_task('print_report')
 
@@ -0,0 +1,142 @@
+import math
+from typing import Callable, Tuple, List, Sequence
+from learn_python.tests.complexity import COMPLEXITIES, measure_time, fit, RESOLUTION
+
+
+# a task function may take this many times as long as the reference before it is
+# cut off - it is graded on how its run time grows, this only stops runaways
+FACTOR = 100
+
+# the input sizes task functions are timed at by default
+SIZES = (250, 500, 1000, 2000)
+
+# how much steeper than the reference's the task function's growth curve may be
+# on a log-log plot before we call it asymptotically worse - 1 is a whole power of n
+GROWTH_TOLERANCE = 0.5
+
+# each measurement is made from this many calls
+REPEAT = 5
+
+# run times below this many seconds are too short to tell growth rates apart on a
+# busy machine
+TIME_FLOOR = 1e-3
+
+# a call is never cut off before it has taken this many seconds - another process
+# can easily hold the cpu for a few milliseconds
+CUTOFF_FLOOR = 0.1
+
+# a task function only fails if it scales worse than the reference this many
+# times in a row - a burst of load from another process can bend one curve
+ATTEMPTS = 2
+
+
+class TooSlow(AssertionError):
+    """
+    Raised when a task function is correct but too slow. Tests that fail with this
+    error are given the TOO_SLOW status instead of FAILED.
+    """
+
+
+def growth(sizes: Sequence[int], times: Sequence[float]) -> float:
+    """
+    Get the slope of the least squares line through the (size, time) points on a
+    log-log plot. A function whose run time grows like n^k has a slope of about k.
+    """
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(time, 1e-9)) for time in times]
+    x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+    return (
+        sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) /
+        sum((x - x_mean) ** 2 for x in xs)
+    )
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f'{seconds:.2f}s'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f}ms'
+    return f'{seconds * 1e6:.0f}µs'
+
+
+def assert_performance(
+    function: Callable,
+    reference: Callable,
+    inputs: Callable[[int], tuple],
+    sizes: Sequence[int] = SIZES,
+    factor: float = FACTOR
+):
+    """
+    Assert that the run time of the given task function grows no faster with the
+    size of its input than a reference solution's. A correct solution can still be
+    a poor one if it does asymptotically more work than it needs to. Absolute times
+    depend too much on the machine and on what else it is doing to grade by, so
+    they only cut off solutions that are slower by orders of magnitude.
+
+    Usage::
+
+        assert_performance(
+            list_intersection,
+            reference=list_intersection_reference,
+            inputs=list_intersection_inputs
+        )
+
+    :param function: The task function to check
+    :param reference: A reference solution with the same signature
+    :param inputs: A function that returns the tuple of arguments to call the
+        functions with for a given input size
+    :param sizes: The input sizes to time the functions at, smallest to largest
+    :param factor: The function fails if it takes more than this many times as long
+        as the reference at any size
+    :raises TooSlow: if the function scales worse than the reference, or is far
+        too slow
+    """
+    sizes = tuple(sizes)
+    for attempt in range(ATTEMPTS):
+        times, expected = measure(function, reference, inputs, sizes, factor)
+        slope, reference_slope = growth(sizes, times), growth(sizes, expected)
+        if not (
+            slope > reference_slope + GROWTH_TOLERANCE and
+            times[-1] > max(expected[-1], TIME_FLOOR)
+        ):
+            return
+    complexity = fit(sizes, times, floor=RESOLUTION)
+    reference_complexity = fit(sizes, expected, floor=RESOLUTION)
+    if COMPLEXITIES.index(complexity) <= COMPLEXITIES.index(reference_complexity):
+        # too few sizes to tell the classes apart - fall back to the exponents
+        complexity, reference_complexity = f'n^{slope:.1f}', f'n^{reference_slope:.1f}'
+    raise TooSlow(
+        f'{function.__name__}() scales worse than it should: its run time grows '
+        f'like {complexity} in the size of its input, a reference solution\'s '
+        f'grows like {reference_complexity}.'
+    )
+
+
+def measure(
+    function: Callable,
+    reference: Callable,
+    inputs: Callable[[int], tuple],
+    sizes: Tuple[int, ...],
+    factor: float
+) -> Tuple[List[float], List[float]]:
+    """
+    Time the task function and the reference at each size, one right after the
+    other so that both are timed under the same load.
+
+    :return: A 2-tuple of the function's times and the reference's times
+    :raises TooSlow: if a call to the function takes more than factor times as
+        long as the reference, and longer than CUTOFF_FLOOR, at any size
+    """
+    times, expected = [], []
+    for size in sizes:
+        args = inputs(size)
+        expected.append(measure_time(reference, args, repeat=REPEAT))
+        limit = max(factor * expected[-1], CUTOFF_FLOOR)
+        times.append(measure_time(function, args, repeat=REPEAT, limit=limit))
+        if times[-1] > limit:
+            raise TooSlow(
+                f'{function.__name__}() is too slow: it took {format_seconds(times[-1])} '
+                f'for an input of size {size}, more than {factor}x the '
+                f'{format_seconds(expected[-1])} a reference solution takes.'
+            )
+    return times, expected
@@ -0,0 +1,489 @@
+import gc
+import os
+import sys
+import time
+import math
+import atexit
+import signal
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Optional, List, Iterable, Union
+from learn_python.utils import Singleton
+import pytest
+from learn_python.tests.tasks import Task, TaskStatus, TaskProfile, run_sessions
+
+try:
+    import resource
+except ImportError:  # resource limits are only available on unix
+    resource = None
+
+
+class GradingPool:
+    """
+    A pool of worker processes that grade tasks in parallel. Each task is graded
+    in a worker process on its own, so a student function that crashes the
+    interpreter or hangs past its timeout only takes down the worker grading it.
+    Dead workers are replaced and grading continues with the remaining tasks.
+
+    Usage::
+
+        with GradingPool(processes=8) as pool:
+            pool.run(tasks)
+
+    Most code should use run_tasks(tasks, processes=8) instead, which also
+    handles forced reruns and cached results.
+
+    Each worker grades its share of the tasks in one pytest session. Where the
+    platform supports it, workers limit the address space each test function may
+    grow by (RLIMIT_AS) and the cpu time each batch of tests may use (RLIMIT_CPU).
+    A test that runs out of memory fails with a MemoryError, see MemoryGuard. A
+    batch that burns through its cpu time is killed and graded again a task at a
+    time.
+
+    :param processes: The number of worker processes, defaults to the number of
+        cpus this process may run on.
+    :param memory_limit: The number of bytes of address space a test may allocate,
+        None for no limit.
+    :param cpu_limit: The number of seconds of cpu time a test may use, None to use
+        the task's timeout.
+    """
+
+    processes: int
+    workers: List['GradingPool.Worker']
+    memory_limit: Optional[int]
+    cpu_limit: Optional[float]
+
+    # seconds beyond a task's timeout that we will wait for its worker before
+    # we kill it - pytest-timeout should normally fire well before this
+    GRACE = 5
+
+    MEMORY_LIMIT = 1024 ** 3
+
+    # a worker costs about as much to start as grading this many tasks - see
+    # pool_size()
+    MIN_BATCH = 8
+
+    # how worker processes are started, None for the platform default
+    START_METHOD: Optional[str] = None
+
+    class Worker:
+        """A handle on a worker process and the batch of tasks it is grading, if any."""
+
+        process: multiprocessing.Process
+        connection: multiprocessing.connection.Connection
+        tasks: List[Task]
+        deadline: Optional[float] = None
+
+        def __init__(self, context):
+            self.tasks = []
+            self.connection, child = context.Pipe()
+            self.process = context.Process(target=work, args=(child,), daemon=True)
+            self.process.start()
+            child.close()
+
+        def submit(self, tasks: List[Task], memory_limit: Optional[int], cpu_limit: float):
+            self.tasks = tasks
+            self.deadline = (
+                time.monotonic() + sum(task.timeout for task in tasks) + GradingPool.GRACE
+            )
+            self.connection.send((
+                [(task.module, task.name) for task in tasks], memory_limit, cpu_limit
+            ))
+
+        def kill(self):
+            self.connection.close()
+            self.process.kill()
+            self.process.join()
+
+        def stop(self):
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=GradingPool.GRACE)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+            self.connection.close()
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        memory_limit: Optional[int] = MEMORY_LIMIT,
+        cpu_limit: Optional[float] = None
+    ):
+        self.processes = processes or cpu_count()
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit
+        self.context = multiprocessing.get_context(
+            self.START_METHOD
+            if self.START_METHOD in multiprocessing.get_all_start_methods() else None
+        )
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, tasks: Iterable[Task]):
+        """
+        Grade the given tasks across the pool. Tasks that have already been
+        run will not run again. See run_tasks()
+
+        The tasks are split into one batch for each worker, and each batch is graded
+        in a single pytest session. If a worker crashes or hangs its batch is graded
+        again a task at a time, so only the task that took it down fails.
+
+        :param tasks: The tasks to grade
+        :return: the list of tasks
+        """
+        tasks = list(tasks)
+        pending = [task for task in tasks if task.status is TaskStatus.NOT_RUN]
+        size = math.ceil(len(pending) / self.processes) or 1
+        batches = [pending[idx:idx + size] for idx in range(0, len(pending), size)]
+        batches.reverse()  # we pop off the end
+
+        while len(self.workers) < min(self.processes, len(batches)):
+            self.workers.append(self.Worker(self.context))
+
+        busy = []
+        while batches or busy:
+            for worker in self.workers:
+                if batches and not worker.tasks:
+                    batch = batches.pop()
+                    worker.submit(
+                        batch,
+                        self.memory_limit,
+                        sum(self.cpu_limit or task.timeout + self.GRACE for task in batch)
+                    )
+                    busy.append(worker)
+
+            timeout = max(0, min(worker.deadline for worker in busy) - time.monotonic())
+            ready = wait([worker.connection for worker in busy], timeout=timeout)
+            for worker in list(busy):
+                task = worker.tasks[0]
+                if worker.connection in ready:
+                    try:
+                        results, retire = worker.connection.recv()
+                    # a worker that dies before reading its job resets the pipe
+                    except (EOFError, ConnectionResetError):
+                        worker.process.join()
+                        if len(worker.tasks) > 1:
+                            self.split(worker, batches)
+                        elif (
+                            hasattr(signal, 'SIGXCPU') and
+                            worker.process.exitcode == -signal.SIGXCPU
+                        ):
+                            self.fail(
+                                worker,
+                                f'The test for {task.module}::{task.name} used more '
+                                f'than {self.cpu_limit or task.timeout + self.GRACE} '
+                                f'seconds of cpu time.'
+                            )
+                        else:
+                            self.fail(
+                                worker,
+                                f'The test for {task.module}::{task.name} crashed its '
+                                f'worker process (exit code: {worker.process.exitcode}).'
+                            )
+                    else:
+                        for task, result in zip(worker.tasks, results):
+                            status, task.error, task.output, profile, task.violations = result
+                            task.status = TaskStatus(status)
+                            task.profile = TaskProfile.from_dict(profile)
+                        worker.tasks = []
+                        if retire:
+                            worker.stop()
+                            self.replace(worker)
+                elif time.monotonic() >= worker.deadline:
+                    exhausted = self.memory_limit and out_of_memory(worker.process.pid)
+                    worker.kill()
+                    if len(worker.tasks) > 1:
+                        self.split(worker, batches)
+                    elif exhausted:
+                        self.fail(
+                            worker,
+                            f'The test for {task.module}::{task.name} ran out of memory, '
+                            f'it may allocate at most {self.memory_limit // 1024 ** 2} MB.',
+                            status=TaskStatus.FAILED
+                        )
+                    else:
+                        self.fail(
+                            worker,
+                            f'The test for {task.module}::{task.name} did not finish '
+                            f'within {task.timeout + self.GRACE} seconds.'
+                        )
+                else:
+                    continue
+                busy.remove(worker)
+
+        return tasks
+
+    def split(self, worker: Worker, batches: List[List[Task]]):
+        """
+        Queue the tasks of a worker that went down to be graded again one at a time,
+        so only the task that took it down fails, and replace the worker.
+        """
+        batches.extend([task] for task in reversed(worker.tasks))
+        self.replace(worker)
+
+    def fail(self, worker: Worker, error: str, status: TaskStatus = TaskStatus.ERROR):
+        """Mark the worker's tasks as errored, or failed, and replace the worker."""
+        for task in worker.tasks:
+            task.status = status
+            task.error = error
+        self.replace(worker)
+
+    def replace(self, worker: Worker):
+        """Replace the worker with a new one."""
+        self.workers[self.workers.index(worker)] = self.Worker(self.context)
+
+    def close(self):
+        """Shut down all of the worker processes."""
+        for worker in self.workers:
+            worker.stop()
+        self.workers.clear()
+
+
+class Sandbox(Singleton, GradingPool):
+    """
+    A pool of warm, resource limited workers that lives as long as the process
+    does. Use this to grade untrusted task code from long running processes like
+    the tutor - tasks are isolated from the process without paying to start a new
+    worker each time. See Task.run(isolate=True) and run_tasks(sandbox=True)
+
+    Workers are started lazily, usually long after the process has started
+    threads of its own. Forking a threaded process can deadlock the child, so
+    workers are started from a fork server where the platform has one - the
+    default (spawn) elsewhere.
+    """
+
+    START_METHOD = 'forkserver'
+
+    def __init__(self):
+        super().__init__()
+        atexit.register(self.close)
+
+
+def cpu_count() -> int:
+    """The number of cpus this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on mac or windows
+        return os.cpu_count() or 1
+
+
+def pool_size(tasks: int, processes: int) -> int:
+    """
+    The number of worker processes it pays to grade the given number of tasks
+    across. Starting a worker and its pytest session is expensive, so every worker
+    must have at least GradingPool.MIN_BATCH tasks to grade and there must be a cpu
+    to run it on. A pool of fewer than two workers does not pay at all - grade the
+    tasks in this process instead.
+
+    :param tasks: The number of tasks to grade
+    :param processes: The most worker processes to use
+    """
+    return min(processes, cpu_count(), tasks // GradingPool.MIN_BATCH)
+
+
+def address_space(pid: Union[int, str] = 'self') -> int:
+    """The size of a process's virtual address space in bytes, 0 if unknown."""
+    try:
+        with open(f'/proc/{pid}/statm') as statm:
+            return int(statm.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def out_of_memory(pid: int) -> bool:
+    """
+    True if the address space of the process has grown to within MemoryGuard.SLACK
+    of its limit. A test that exhausts its memory is normally failed by MemoryGuard,
+    but the interpreter can also spin once it runs out - when tracemalloc is
+    tracing for instance - so workers are checked before they are killed.
+    """
+    try:
+        with open(f'/proc/{pid}/limits') as limits:
+            limit = next(
+                line.split()[3] for line in limits if line.startswith('Max address space')
+            )
+    except (OSError, IndexError, StopIteration):
+        return False
+    return limit.isdigit() and address_space(pid) >= int(limit) - MemoryGuard.SLACK
+
+
+def limit_memory(memory_limit: Optional[int]) -> Optional[int]:
+    """
+    Limit how far the address space of this process may grow. The limit is never
+    set above the hard limit.
+
+    :param memory_limit: The number of bytes the address space may grow by, None
+        to lift the limit
+    :return: The limit in bytes, None if there is none
+    """
+    if resource is None:
+        return None
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = hard
+    if memory_limit and address_space():
+        soft = address_space() + memory_limit
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    return None if soft == resource.RLIM_INFINITY else soft
+
+
+def limit_cpu(cpu_limit: float):
+    """
+    Limit the cpu time the next batch of tests run in this process may use. Workers
+    are reused so the limit is set relative to what the worker has already used.
+
+    :param cpu_limit: The number of seconds of cpu time the tests may use
+    """
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + cpu_limit)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+class MemoryGuard:
+    """
+    A pytest plugin that limits the address space only while each test function
+    runs, so that pytest itself never runs out of memory collecting the test or
+    reporting its outcome. A test that runs out of memory fails with a MemoryError
+    that says so - however the exhaustion surfaced in the test.
+
+    :param memory_limit: The number of bytes the address space may grow by while
+        a test function runs, None for no limit
+    """
+
+    memory_limit: Optional[int]
+
+    # true once a test has run out of memory - the worker should be retired, its
+    # address space grew and is not given back
+    exhausted: bool = False
+
+    # a test that fails with its address space this close to the limit ran out of
+    # memory, whatever error it failed with
+    SLACK = 64 * 1024 ** 2
+
+    def __init__(self, memory_limit: Optional[int]):
+        self.memory_limit = memory_limit
+
+    # the innermost wrapper, so the other wrappers never run under the limit
+    @pytest.hookimpl(hookwrapper=True, trylast=True)
+    def pytest_runtest_call(self, item):
+        if resource is None:
+            yield
+            return
+        # the garbage of earlier tests would count against the limit
+        gc.collect()
+        unlimited = resource.getrlimit(resource.RLIMIT_AS)
+        limit = limit_memory(self.memory_limit)
+        outcome = yield
+        # nothing can be relied on to allocate until the limit is lifted
+        resource.setrlimit(resource.RLIMIT_AS, unlimited)
+        exhausted = limit is not None and outcome.excinfo is not None and (
+            issubclass(outcome.excinfo[0], MemoryError) or
+            address_space() >= limit - self.SLACK
+        )
+        if exhausted:
+            self.exhausted = True
+            trace = outcome.excinfo[2]
+            try:
+                # free what the test allocated before it is reported
+                traceback.clear_frames(trace)
+            except BaseException:
+                pass  # like a timeout, which must not hide that memory ran out
+            outcome.force_exception(MemoryError(
+                f'The test ran out of memory, it may allocate at most '
+                f'{self.memory_limit // 1024 ** 2} MB.'
+            ).with_traceback(trace))
+
+
+def grade(tasks: List[Task], guard: Optional[MemoryGuard] = None):
+    """
+    Grade the tasks in one pytest session. The output of each test is captured for
+    its task, including anything written below the python layer. Anything written
+    outside of the tests cannot be told apart by task and is discarded, so that it
+    never reaches the terminal.
+
+    :param tasks: The tasks to grade
+    :param guard: Limits the memory each test function may use, if given
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+    try:
+        # the parent process is responsible for the result cache
+        for task in tasks:
+            task.reset()
+            if task.stale:
+                task.reload()
+        run_sessions(
+            [task for task in tasks if task.status is TaskStatus.NOT_RUN],
+            plugins=[guard] if guard else [],
+            capture='fd'
+        )
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+
+
+def work(connection):
+    """
+    The worker process main loop. Receives ([(module, task name), ...], memory
+    limit, cpu limit) jobs and grades each batch of tasks in one session. Sends back
+    ([(status, error, output, profile, violations), ...], retire) results until it
+    is told to stop, or until a test runs out of memory - then retire is true and
+    the worker exits.
+
+    :param connection: The worker's end of the pipe to the pool
+    """
+    from learn_python.register import lock_reporting
+    from learn_python.tests.tests import tasks
+
+    # the pool grades many batches - never report after one
+    lock_reporting()
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        jobs, memory_limit, cpu_limit = job
+        batch = [tasks[module][name] for module, name in jobs]
+        limit_cpu(cpu_limit)
+        guard = MemoryGuard(memory_limit)
+        grade(batch, guard)
+        connection.send((
+            [
+                (
+                    int(task.status),
+                    task.error,
+                    task.output,
+                    task.profile.to_dict() if task.profile else None,
+                    task.violations
+                ) for task in batch
+            ],
+            guard.exhausted
+        ))
+        if guard.exhausted:
+            break
@@ -0,0 +1,202 @@
+import sys
+import importlib
+import traceback
+from io import StringIO
+from pathlib import Path
+from contextlib import redirect_stdout
+from types import ModuleType
+from typing import Dict, Set, List, Optional, Iterable
+from learn_python.utils import Singleton
+
+
+class ModuleReloader(Singleton):
+    """
+    Tracks the modules that hold the student's task code, the state of their source
+    files when they were loaded and which of them import from which others. When
+    task code changes on disk only the modules that changed, and the modules that
+    import from them, are reloaded - dependencies first.
+
+    Any loaded module that lives in the same directory as a tracked module is
+    tracked too, so helper modules the student writes are picked up.
+
+    Usage::
+
+        ModuleReloader().track(task_module)
+        ...
+        errors = ModuleReloader().reload()
+    """
+
+    # module name -> modification time of its source when it was loaded
+    mtimes: Dict[str, Optional[float]]
+
+    # module name -> the number of times it has been reloaded
+    generations: Dict[str, int]
+
+    # module name -> the error encountered the last time it was (re)loaded
+    errors: Dict[str, str]
+
+    directories: Set[Path]
+
+    # the names of the loaded modules that have been checked against the tracked
+    # directories
+    seen: Set[str]
+
+    def __init__(self):
+        self.mtimes = {}
+        self.generations = {}
+        self.errors = {}
+        self.directories = set()
+        self.seen = set()
+
+    @staticmethod
+    def source_mtime(module: ModuleType) -> Optional[float]:
+        source = getattr(module, '__file__', None)
+        if source and Path(source).is_file():
+            return Path(source).stat().st_mtime
+        return None
+
+    def track(self, module: Optional[ModuleType] = None):
+        """
+        Start tracking the given module and its directory, and pick up any newly
+        loaded modules that live in tracked directories. Only modules loaded since
+        the last call are checked, unless a new directory is tracked.
+        """
+        if module is not None and getattr(module, '__file__', None):
+            directory = Path(module.__file__).parent
+            if directory not in self.directories:
+                self.directories.add(directory)
+                self.seen.clear()  # modules already seen may live in it
+        for name in sys.modules.keys() - self.seen:
+            self.seen.add(name)
+            loaded = sys.modules.get(name, None)
+            if name in self.mtimes or not getattr(loaded, '__file__', None):
+                continue
+            if Path(loaded.__file__).parent in self.directories:
+                self.mtimes[name] = self.source_mtime(loaded)
+                self.generations[name] = 0
+
+    def dependencies(self) -> Dict[str, Set[str]]:
+        """
+        Get a mapping from each tracked module to the tracked modules it imports,
+        or imports objects from.
+        """
+        dependencies = {}
+        for name in self.mtimes:
+            module = sys.modules.get(name, None)
+            dependencies[name] = set()
+            if module is None:
+                continue
+            for value in list(vars(module).values()):
+                if isinstance(value, ModuleType):
+                    dep = value.__name__
+                else:
+                    dep = getattr(value, '__module__', None)
+                if dep != name and dep in self.mtimes:
+                    dependencies[name].add(dep)
+        return dependencies
+
+    def closure(self, names: Iterable[str]) -> Set[str]:
+        """Get the given modules and all of the tracked modules they depend on."""
+        dependencies = self.dependencies()
+        closure = set()
+        to_visit = list(names)
+        while to_visit:
+            name = to_visit.pop()
+            if name not in closure:
+                closure.add(name)
+                to_visit.extend(dependencies.get(name, []))
+        return closure
+
+    def changed(self) -> Set[str]:
+        """Get the tracked modules whose source has changed since they were loaded."""
+        self.track()
+        return {
+            name for name, mtime in self.mtimes.items()
+            if name not in sys.modules or self.source_mtime(sys.modules[name]) != mtime
+        }
+
+    def generation(self, names: Iterable[str]) -> tuple:
+        """
+        A value that changes whenever any of the given modules, or any module they
+        depend on, is reloaded.
+        """
+        return tuple(sorted(
+            (name, self.generations.get(name, 0)) for name in self.closure(names)
+        ))
+
+    def is_stale(self, names: Iterable[str]) -> bool:
+        """True if any of the given modules, or any module they depend on, has changed."""
+        return bool(self.changed() & self.closure(names))
+
+    def reload(self) -> Dict[str, str]:
+        """
+        Reload every tracked module whose source changed, and every module that
+        imports from those modules, in dependency order.
+
+        :return: The errors of any modules that failed to load, keyed by module name
+        """
+        changed = self.changed()
+        if not changed:
+            return self.errors
+
+        dependencies = self.dependencies()
+        dependents = {}
+        for name, deps in dependencies.items():
+            for dep in deps:
+                dependents.setdefault(dep, set()).add(name)
+
+        to_reload = set()
+        to_visit = list(changed)
+        while to_visit:
+            name = to_visit.pop()
+            if name not in to_reload:
+                to_reload.add(name)
+                to_visit.extend(dependents.get(name, []))
+
+        for name in self.order(to_reload, dependencies):
+            self.load(name)
+        self.track()
+        return self.errors
+
+    @staticmethod
+    def order(names: Set[str], dependencies: Dict[str, Set[str]]) -> List[str]:
+        """
+        Topologically sort the modules so each comes after the modules it depends on.
+        Modules in import cycles are appended in name order.
+        """
+        remaining = {name: dependencies.get(name, set()) & names for name in names}
+        ordered = []
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps)
+            if not ready:
+                ready = sorted(remaining)  # cycle - do the best we can
+            for name in ready:
+                del remaining[name]
+                for deps in remaining.values():
+                    deps.discard(name)
+            ordered.extend(ready)
+        return ordered
+
+    def load(self, name: str) -> Optional[ModuleType]:
+        """
+        Import or reload the named module, recording any error.
+
+        :return: The module or None if it could not be loaded
+        """
+        module = None
+        f = StringIO()
+        try:
+            with redirect_stdout(f):  # silence!
+                if name in sys.modules:
+                    module = importlib.reload(sys.modules[name])
+                else:
+                    module = importlib.import_module(name)
+            self.errors.pop(name, None)
+        except (Exception, SystemExit):  # student code may well call exit()
+            self.errors[name] = traceback.format_exc()
+        loaded = sys.modules.get(name, None)
+        self.mtimes[name] = self.source_mtime(loaded) if loaded else None
+        self.generations[name] = self.generations.get(name, -1) + 1
+        if module is not None:
+            self.track(module)
+        return module
@@ -0,0 +1,221 @@
+import ast
+from typing import Callable, Dict, List, Optional, Sequence, Union
+from learn_python.tests.utils import SourceIndex, source_index
+
+
+# descriptions of the syntax students are asked to use, or not to use
+NODE_DESCRIPTIONS = {
+    ast.For: 'a for loop',
+    ast.While: 'a while loop',
+    ast.Break: 'a break statement',
+    ast.Continue: 'a continue statement',
+    ast.Pass: 'a pass statement',
+    ast.FunctionDef: 'a nested function definition',
+    ast.IfExp: 'a ternary if expression',
+    ast.ListComp: 'a list comprehension',
+    ast.SetComp: 'a set comprehension',
+    ast.DictComp: 'a dictionary comprehension',
+    ast.Slice: 'a slice',
+    ast.AugAssign: 'an augmented assignment such as +=',
+    ast.JoinedStr: 'an f-string',
+    ast.BoolOp: 'a logical operator (and/or)',
+    ast.And: 'the logical operator "and"',
+    ast.Or: 'the logical operator "or"',
+    ast.Mult: 'the * operator'
+}
+
+# plural forms for counted syntax
+NODE_PLURALS = {
+    ast.ListComp: 'list comprehensions',
+    ast.Slice: 'slices',
+    ast.For: 'for loops'
+}
+
+# a function, or the name of a function or method
+Call = Union[str, Callable]
+
+
+def describe(node_type: type) -> str:
+    return NODE_DESCRIPTIONS.get(node_type, f'a {node_type.__name__} node')
+
+
+def call_name(called: Call) -> str:
+    return called if isinstance(called, str) else called.__name__
+
+
+def plural(count: int, singular: str, many: str) -> str:
+    return f'{count} {singular if count == 1 else many}'
+
+
+class RequirementsNotMet(AssertionError):
+    """
+    Raised when a task function works but is not written the way the task asks.
+    Every requirement it misses is listed, not just the first.
+
+    :param violations: Descriptions of each requirement the function does not meet
+    """
+
+    violations: List[str]
+
+    def __init__(self, violations: List[str]):
+        self.violations = violations
+        super().__init__('; '.join(violations))
+
+
+class Requirements:
+    """
+    A declarative description of how a task function must be written. All of the
+    requirements are checked against a single SourceIndex of the function, which is
+    built in one pass over its syntax tree and cached. See source_index()
+
+    Usage::
+
+        list_intersection2_requirements = Requirements(
+            statements=1,
+            require=[ast.ListComp],
+            forbid=[ast.For],
+            forbid_calls=['set']
+        )
+        list_intersection2_requirements.check(list_intersection2)
+
+    :param statements: The exact number of statements the function body must have.
+        A docstring is always allowed on top of this.
+    :param max_statements: The most statements the function body may have, plus an
+        optional docstring
+    :param require: Types of syntax nodes the function must use
+    :param forbid: Types of syntax nodes the function must not use
+    :param counts: The exact number of times the function must use each type of
+        syntax node
+    :param calls: Functions, or names of functions or methods, the function must call
+    :param forbid_calls: Functions, or names of functions or methods, the function
+        must not call
+    :param call_counts: The exact number of times the function must call each of
+        these functions, by function or name
+    :param max_calls: The most function calls the function may make in total
+    :param format_spec: If True the function must use an f-string format specifier,
+        if False it must not
+    """
+
+    statements: Optional[int] = None
+    max_statements: Optional[int] = None
+    require: Sequence[type] = ()
+    forbid: Sequence[type] = ()
+    counts: Dict[type, int]
+    calls: Sequence[Call] = ()
+    forbid_calls: Sequence[Call] = ()
+    call_counts: Dict[Call, int]
+    max_calls: Optional[int] = None
+    format_spec: Optional[bool] = None
+
+    def __init__(
+        self,
+        statements=statements,
+        max_statements=max_statements,
+        require=require,
+        forbid=forbid,
+        counts=None,
+        calls=calls,
+        forbid_calls=forbid_calls,
+        call_counts=None,
+        max_calls=max_calls,
+        format_spec=format_spec
+    ):
+        self.statements = statements
+        self.max_statements = max_statements
+        self.require = require
+        self.forbid = forbid
+        self.counts = counts or {}
+        self.calls = calls
+        self.forbid_calls = forbid_calls
+        self.call_counts = call_counts or {}
+        self.max_calls = max_calls
+        self.format_spec = format_spec
+
+    @staticmethod
+    def count(index: SourceIndex, node_type: type) -> int:
+        """The number of nodes of the given type, not counting the definition itself."""
+        return index.count(node_type) - isinstance(index.definition, node_type)
+
+    @staticmethod
+    def body_statements(index: SourceIndex) -> int:
+        """The number of statements in the definition's body, not counting a docstring."""
+        definition = index.definition
+        if not isinstance(definition, (ast.FunctionDef, ast.ClassDef)):
+            return 0
+        docstring = ast.get_docstring(definition, clean=False) is not None
+        return index.statements - 1 - docstring
+
+    def violations(self, func) -> List[str]:
+        """
+        Check the function against every requirement.
+
+        :param func: The function, or its syntax tree or SourceIndex
+        :return: A description of each requirement the function does not meet, in
+            the order they were declared. Empty if all of them are met.
+        """
+        index = source_index(func)
+        name = f'{index.definition.name}()' if index.definition else 'The function'
+        violations = []
+
+        statements = self.body_statements(index)
+        if self.statements is not None and statements != self.statements:
+            violations.append(
+                f'{name} should only require {plural(self.statements, "statement", "statements")}, '
+                f'or {plural(self.statements, "statement", "statements")} plus a docstring'
+            )
+        if self.max_statements is not None and statements > self.max_statements:
+            violations.append(
+                f'{name} should require at most '
+                f'{plural(self.max_statements, "statement", "statements")}, plus a docstring'
+            )
+
+        for node_type in self.require:
+            if not self.count(index, node_type):
+                violations.append(f'{name} must use {describe(node_type)}')
+        for node_type in self.forbid:
+            if self.count(index, node_type):
+                violations.append(f'{name} must not use {describe(node_type)}')
+        for node_type, expected in self.counts.items():
+            if self.count(index, node_type) != expected:
+                violations.append(
+                    f'{name} should use exactly ' + plural(
+                        expected,
+                        describe(node_type).partition(' ')[2],
+                        NODE_PLURALS.get(node_type, describe(node_type))
+                    )
+                )
+
+        for called in self.calls:
+            if call_name(called) not in index.call_names:
+                violations.append(f'{name} must call {call_name(called)}()')
+        for called in self.forbid_calls:
+            if call_name(called) in index.call_names:
+                violations.append(f'{name} must not call {call_name(called)}()')
+        for called, expected in self.call_counts.items():
+            if index.function_call_names[call_name(called)] != expected:
+                violations.append(
+                    f'{name} should call {call_name(called)}() exactly '
+                    f'{plural(expected, "time", "times")}'
+                )
+        if self.max_calls is not None and index.calls > self.max_calls:
+            violations.append(
+                f'{name} may only call another function a maximum of '
+                f'{plural(self.max_calls, "time", "times")}'
+            )
+
+        if self.format_spec is True and not index.format_spec:
+            violations.append(f'{name} must use f-string format specifiers')
+        elif self.format_spec is False and index.format_spec:
+            violations.append(
+                f'{name} cannot use an f-string format specifier: {index.format_spec}'
+            )
+        return violations
+
+    def check(self, func):
+        """
+        :raises RequirementsNotMet: listing every requirement the function does not
+            meet, if there are any
+        """
+        violations = self.violations(func)
+        if violations:
+            raise RequirementsNotMet(violations)
@@ -4,21 +4,28 @@ import pytest
 from pathlib import Path
 import sys
 from warnings import warn
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Iterable
 from types import FunctionType, ModuleType
 import inspect
 from contextlib import redirect_stdout
 from io import StringIO
-from learn_python.tests.utils import import_string
+from learn_python.tests.reload import ModuleReloader
 import importlib
 import contextlib
 import re
 import io
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
 
 
 PACKAGE_DIR = Path(__file__).parent.parent.parent
 
-running_task = None
+# maps (test module, test function) to the tasks graded by the running session
+running_tasks = {}
 
 
 class TaskStatus(IntEnum):
@@ -31,12 +38,108 @@ class TaskStatus(IntEnum):
     SKIPPED = 2
     FAILED = 3
     ERROR = 4
+    RELOAD_ERROR = 5
+    TOO_SLOW = 6
 
     @property
     def css(self):
         return self.name.lower().replace('_', '-')
 
 
+def peak_rss(reset: bool = False) -> Optional[int]:
+    """
+    Get the peak resident set size of this process in bytes, or None if it cannot
+    be determined.
+
+    :param reset: Reset the peak to the current resident set size first - only
+        possible on linux. Elsewhere the peak is the peak over the life of the
+        process.
+    """
+    if reset:
+        try:
+            with open('/proc/self/clear_refs', 'w') as clear_refs:
+                clear_refs.write('5')
+        except OSError:
+            pass
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in kilobytes on linux and bytes on mac
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+    return None
+
+
+class TaskProfile:
+    """
+    The time and memory a task's test took the last time it ran.
+
+    :param setup: Seconds spent setting up the test
+    :param call: Seconds spent in the test itself
+    :param teardown: Seconds spent tearing down the test
+    :param peak_rss: The peak resident set size of the grading process while the
+        test ran, in bytes
+    :param allocated: The bytes allocated by python during the test that were still
+        allocated when it finished
+    :param allocated_peak: The most bytes allocated by python at any point during
+        the test
+    """
+
+    setup: float = 0.0
+    call: float = 0.0
+    teardown: float = 0.0
+    peak_rss: Optional[int] = None
+    allocated: Optional[int] = None
+    allocated_peak: Optional[int] = None
+
+    def __init__(
+        self,
+        setup=setup,
+        call=call,
+        teardown=teardown,
+        peak_rss=peak_rss,
+        allocated=allocated,
+        allocated_peak=allocated_peak
+    ):
+        self.setup = setup
+        self.call = call
+        self.teardown = teardown
+        self.peak_rss = peak_rss
+        self.allocated = allocated
+        self.allocated_peak = allocated_peak
+
+    @property
+    def duration(self):
+        """The total seconds taken by the test"""
+        return self.setup + self.call + self.teardown
+
+    def to_dict(self):
+        return {
+            'setup': self.setup,
+            'call': self.call,
+            'teardown': self.teardown,
+            'duration': self.duration,
+            'peak_rss': self.peak_rss,
+            'allocated': self.allocated,
+            'allocated_peak': self.allocated_peak
+        }
+
+    @classmethod
+    def from_dict(cls, profile: Optional[dict]):
+        if profile is None:
+            return None
+        return cls(**{
+            attr: profile[attr] for attr in [
+                'setup', 'call', 'teardown', 'peak_rss', 'allocated', 'allocated_peak'
+            ] if attr in profile
+        })
+
+
 class Task:
     """
     A data structure holding pertinent information about gateway tasks. Methods
@@ -47,25 +150,41 @@ class Task:
     :param path: the path to the file on disk holding the source code
     :param function: the function if the task is a function, else None. 
         If the function is not yet implemented it will be the string name
-        of the function instead of the function itself
+        of the function instead of the function itself. Task code is not
+        imported until the function or modules are first needed, so the
+        function may also be given as its name.
     :param test: import string of the function test
     :param module: the module the task is a part of
     :param status: the status of the task/if it has been run during the current
         invocation cycle
+    :param output: the stdout and stderr captured while the task's test ran
+    :param profile: the time and memory the task's test took the last time it ran
+    :param violations: the requirements on how the task must be written that the
+        task code did not meet, if that is why its test failed. See Requirements
     """
 
     number: int
     name: str
     path: PathLike[str]
-    function: Optional[Union[FunctionType, str]] = None
-    modules: Optional[List[Union[ModuleType, str]]] = None
+    _function: Optional[Union[FunctionType, str]] = None
+    _modules: Optional[List[Union[ModuleType, str]]] = None
     test: str
     module: str
     status: TaskStatus = TaskStatus.NOT_RUN
     error: Optional[str] = None
+    output: Optional[str] = None
+    profile: Optional[TaskProfile] = None
+    violations: Optional[List[str]] = None
     timeout: int = 5
 
+    # changes when the task's code, or code it depends on, is reloaded
+    generation: Optional[tuple] = None
+
+    # true once the task's code has been imported
+    loaded: bool = False
+
     ERROR_MSG_RGX = re.compile('^E\s+AssertionError[:]\s+(?P<msg>.+)\n\n', re.M)
+    TOO_SLOW_MSG_RGX = re.compile(r'^E\s+(?:\w+[.])*TooSlow[:]\s+(?P<msg>.+)$', re.M)
     MODULE_NUM_RGX = re.compile(r'module(?P<num>\d+)')
 
     def __init__(
@@ -76,8 +195,8 @@ class Task:
         test,
         module,
         status=status,
-        function=function,
-        modules=modules,
+        function=_function,
+        modules=_modules,
         timeout=timeout
     ):
         self.number = number
@@ -86,18 +205,62 @@ class Task:
         self.test = test
         self.module = module
         self.status = status
-        self.function = function
-        self.modules = modules
+        self._function = function
+        self._modules = modules or []
         self.timeout = timeout
 
+    @property
+    def function(self) -> Optional[Union[FunctionType, str]]:
+        """The task function, or its name if it is not implemented."""
+        self.load()
+        return self._function
+
+    @function.setter
+    def function(self, function: Optional[Union[FunctionType, str]]):
+        self._function = function
+
+    @property
+    def modules(self) -> List[Union[ModuleType, str]]:
+        """The modules holding the task's code, or their names if they cannot be imported."""
+        self.load()
+        return self._modules
+
+    def load(self):
+        """
+        Import the task's code, if it has not been imported yet. Tasks are cheap to
+        create - nothing is imported until the task's function or modules are needed
+        or the task is run.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
         f = io.StringIO()
         with redirect_stdout(f):  # silence!
-            for idx, mod in enumerate(self.modules):
+            for idx, mod in enumerate(self._modules):
                 if isinstance(mod, str):
                     try:
-                        self.modules[idx] = importlib.import_module(mod)
-                    except Exception:
+                        self._modules[idx] = importlib.import_module(mod)
+                    except (Exception, SystemExit):
                         pass
+        for mod in self._modules:
+            if not isinstance(mod, str):
+                ModuleReloader().track(mod)
+        self.bind_function()
+        self.generation = ModuleReloader().generation(self.module_names)
+
+    def bind_function(self):
+        """Point the task function at the current definition in the task's modules."""
+        # todo - need a more formal assignment structure, perhaps utilizing ast?
+        # this kinda thing is fairly brittle
+        if self._function is None:
+            return
+        func_name = self._function if isinstance(self._function, str) else self._function.__name__
+        self._function = func_name
+        for mod in self._modules:
+            func_reload = getattr(mod, func_name, None) if not isinstance(mod, str) else None
+            if func_reload and isinstance(func_reload, FunctionType):
+                self._function = func_reload
+                break
 
     @property
     def identifier(self):
@@ -117,67 +280,100 @@ class Task:
     @property
     def error_msg(self):
         """The short, specific error reported by the test"""
+        if self.error and self.status is TaskStatus.RELOAD_ERROR:
+            return self.error.strip().splitlines()[-1]
+        if self.violations and self.status is TaskStatus.FAILED:
+            return '; '.join(self.violations)
+        if self.error and self.status is TaskStatus.TOO_SLOW:
+            mtch = self.TOO_SLOW_MSG_RGX.search(self.error)
+            if mtch:
+                return mtch.groupdict()['msg']
         if self.error:
             mtch = self.ERROR_MSG_RGX.search(self.error, re.M)
             if mtch:
                 return mtch.groupdict()['msg']
         return None
 
-    def run(self, force=False):
+    @property
+    def test_key(self):
         """
-        Run the test for the task. If the test was previously run it will not
-        run again unless force is set to true.
+        A (test module name, test function name) 2-tuple that pytest reports
+        can be routed back to this task by. See pytest_report_teststatus()
         """
-        global running_task
-
-        # only run if we have not run already, unless we are forced!
-        if force and self.status is not TaskStatus.NOT_RUN:
-            # force reload of code from disk, this is likely happening as part
-            # of a tutor workflow
-            f = io.StringIO()
-            with redirect_stdout(f):  # silence!
-                for idx, mod in enumerate(self.modules):
-                    try:
-                        if isinstance(mod, str):
-                            self.modules[idx] = importlib.import_module(mod)
-                        else:
-                            self.modules[idx] = importlib.reload(mod)
-
-                        # todo - need a more formal assignment structure, perhaps utilizing ast?
-                        # this kinda thing is fairly brittle
-                        func_name = self.function if isinstance(self.function, str) else self.function.__name__
-                        func_reload = getattr(self.modules[idx], func_name, None)
-                        if func_reload and isinstance(func_reload, FunctionType):
-                            self.function = func_reload
-
-                        # we also need to reload the test because its imports may be stale
-                        importlib.reload(inspect.getmodule(import_string(self.test)))
-                    except Exception:
-                        pass
-            self.status = TaskStatus.NOT_RUN
-            self.error = None
+        parts = self.test.split('.')
+        return parts[-2], parts[-1]
+
+    @property
+    def module_names(self):
+        """The import strings of the modules holding the task's code"""
+        return [mod if isinstance(mod, str) else mod.__name__ for mod in self._modules]
+
+    @property
+    def stale(self):
+        """
+        True if the task's code, or any code it depends on, has changed on disk or been
+        reloaded since the task was last loaded.
+        """
+        return (
+            not self.loaded or
+            (
+                Path(self.path).is_file() and
+                any(isinstance(mod, str) for mod in self._modules)
+            ) or
+            ModuleReloader().is_stale(self.module_names) or
+            ModuleReloader().generation(self.module_names) != self.generation
+        )
 
+    def reset(self):
+        """
+        Reload any of the task code that changed on disk and clear any previous test
+        results so the task will run again.
+        """
         if self.status is TaskStatus.NOT_RUN:
-            running_task = self
+            return
+        self.status = TaskStatus.NOT_RUN
+        self.error = None
+        self.output = None
+        self.profile = None
+        self.violations = None
+        self.reload()
 
-            out = StringIO()
-            with contextlib.redirect_stdout(out):
-                exit_code = pytest.main(
-                    [f'--timeout={self.timeout}', self.identifier, '-s'],
-                    # register this module as a plugin so our hook will be called
-                    plugins=[sys.modules[__name__]]
-                )
+    def reload(self):
+        """
+        Reload any of the task code that changed on disk, along with any code that
+        depends on it, and rebind the task function. Only changed modules are
+        reloaded, see ModuleReloader. If the task code cannot be loaded the task
+        status will be set to RELOAD_ERROR.
+        """
+        reloader = ModuleReloader()
+        reloader.reload()
+        self.loaded = True
+        if Path(self.path).is_file():
+            for idx, mod in enumerate(self._modules):
+                if isinstance(mod, str):
+                    self._modules[idx] = reloader.load(mod) or mod
+        self.bind_function()
 
-            running_task = None
-            if exit_code not in [pytest.ExitCode.OK, pytest.ExitCode.TESTS_FAILED]:
-                warn(f'Unable to run test for task {self.module}::{self.name}: {exit_code}')
-                self.status = TaskStatus.ERROR
-            
-            if self.status == TaskStatus.NOT_RUN:
-                warn(f'Task status for {self.module}::{self.name} was not updated after run!')
+        self.generation = reloader.generation(self.module_names)
+        errors = [
+            reloader.errors[name]
+            for name in sorted(reloader.closure(self.module_names)) if name in reloader.errors
+        ]
+        if errors:
+            self.status = TaskStatus.RELOAD_ERROR
+            self.error = '\n'.join(errors)
 
-            if self.status in [TaskStatus.ERROR, TaskStatus.FAILED]:
-                self.error = out.getvalue()
+    def run(self, force=False, isolate=False):
+        """
+        Run the test for the task. If the test was previously run it will not
+        run again unless force is set to true.
+
+        :param force: Reload the task code and run the test even if it has run before
+        :param isolate: Run the test in a resource limited worker process so that a
+            crash, hang or runaway allocation in the task code cannot take down this
+            process. See Sandbox
+        """
+        run_tasks([self], force=force, sandbox=isolate)
 
     @property
     def implementation(self):
@@ -193,16 +389,217 @@ class Task:
         return None
 
 
+def run_tasks(
+    tasks: Iterable[Task],
+    force: bool = False,
+    processes: Optional[int] = None,
+    cache: bool = True,
+    sandbox: bool = False
+):
+    """
+    Run the tests for all of the given tasks in as few pytest sessions as possible
+    (one for each distinct task timeout - usually just one). Starting a pytest
+    session is expensive, so grading a whole module this way takes roughly as long
+    as grading a single task did. Tasks that have already been run will not run
+    again unless force is set to true.
+
+    :param tasks: The tasks to run
+    :param force: Reload the task code from disk and run the tasks even if they
+        have already been run or have valid cached results
+    :param processes: If given, grade the tasks in isolation across at most this
+        many worker processes instead of in this process - if there are enough tasks
+        and cpus for the workers to pay for themselves. See GradingPool and
+        pool_size()
+    :param cache: Reuse results from the on-disk result cache where they are still
+        valid and record any new results to it. See ResultCache
+    :param sandbox: Grade the tasks in the process-wide pool of warm, resource
+        limited workers. See Sandbox
+    :return: the list of tasks
+    """
+    tasks = list(tasks)
+    if force:
+        for task in tasks:
+            task.reset()
+
+    # never grade code that has changed since it was loaded
+    for task in tasks:
+        if task.status is TaskStatus.NOT_RUN and task.stale:
+            task.reload()
+
+    fingerprints = {}
+    if cache:
+        from learn_python.tests.cache import ResultCache, fingerprint_tasks
+        result_cache = ResultCache()
+        fingerprints = fingerprint_tasks(
+            task for task in tasks if task.status is TaskStatus.NOT_RUN
+        )
+        if not force:
+            for task, fingerprint in fingerprints.items():
+                result_cache.load(task, fingerprint)
+
+    pending = [task for task in tasks if task.status is TaskStatus.NOT_RUN]
+    if not pending:
+        return tasks
+
+    workers = 0
+    if processes and not sandbox:
+        from learn_python.tests.pool import pool_size
+        workers = pool_size(len(pending), processes)
+
+    if sandbox:
+        from learn_python.tests.pool import Sandbox
+        Sandbox().run(pending)
+    elif workers > 1:
+        from learn_python.tests.pool import GradingPool
+        with GradingPool(processes=workers) as pool:
+            pool.run(pending)
+    else:
+        run_sessions(pending)
+
+    if fingerprints:
+        for task in pending:
+            if task in fingerprints:
+                result_cache.store(task, fingerprints[task])
+        result_cache.save()
+
+    return tasks
+
+
+def run_sessions(tasks: List[Task], plugins: Iterable = (), capture: str = 'sys'):
+    """
+    Run the tests for the given tasks in this process, in one pytest session for
+    each distinct task timeout. The output of each test is captured on its own, so
+    tasks only ever see the output of their own tests.
+
+    :param tasks: The tasks to run
+    :param plugins: Additional pytest plugins to run the sessions with
+    :param capture: The pytest capture method - sys captures what is written
+        through sys.stdout and sys.stderr, fd also captures anything written below
+        the python layer
+    """
+    global running_tasks
+    sessions = {}
+    for task in tasks:
+        sessions.setdefault(task.timeout, []).append(task)
+
+    for timeout, session_tasks in sessions.items():
+        running_tasks = {}
+        identifiers = []
+        for task in session_tasks:
+            task.profile = TaskProfile()
+            running_tasks.setdefault(task.test_key, []).append(task)
+            if task.identifier not in identifiers:
+                identifiers.append(task.identifier)
+
+        out = StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                exit_code = pytest.main(
+                    [f'--timeout={timeout}', f'--capture={capture}', *identifiers],
+                    # register this module as a plugin so our hook will be called
+                    plugins=[sys.modules[__name__], *plugins]
+                )
+        finally:
+            running_tasks = {}
+
+        for task in session_tasks:
+            if (
+                exit_code not in [pytest.ExitCode.OK, pytest.ExitCode.TESTS_FAILED] and
+                task.status is TaskStatus.NOT_RUN
+            ):
+                # the session failed before the test could run, its output says why
+                warn(f'Unable to run test for task {task.module}::{task.name}: {exit_code}')
+                task.status = TaskStatus.ERROR
+                task.error = out.getvalue()
+
+            if task.status == TaskStatus.NOT_RUN:
+                warn(f'Task status for {task.module}::{task.name} was not updated after run!')
+
+
 def pytest_report_teststatus(report, config):
     """
-    This is hook that pytest calls after a test is executed with its outcome.
+    This is hook that pytest calls after a test is executed with its outcome. The
+    outcome, and the output captured while the test ran, are routed to the tasks in
+    the running session that the test belongs to.
     """
-    global running_task
-    if running_task.status == TaskStatus.NOT_RUN:
-        if report.outcome == 'passed' and report.when == 'teardown':
-            running_task.status = TaskStatus.PASSED
-        elif report.outcome == 'failed':
-            running_task.status = TaskStatus.FAILED
-        elif report.outcome == 'skipped' and report.when == 'setup':
-            running_task.status = TaskStatus.SKIPPED
+    test_file, _, test_func = report.nodeid.rpartition('::')
+    for task in running_tasks.get((Path(test_file).stem, test_func), []):
+        # each report carries the output of the test's phases so far
+        task.output = report.capstdout + report.capstderr
+        if task.profile and report.when in ['setup', 'call', 'teardown']:
+            setattr(task.profile, report.when, report.duration)
+        if task.status == TaskStatus.NOT_RUN:
+            if report.outcome == 'passed' and report.when == 'teardown':
+                task.status = TaskStatus.PASSED
+            elif report.outcome == 'failed':
+                task.status = (
+                    TaskStatus.TOO_SLOW if getattr(report, 'too_slow', False)
+                    else TaskStatus.FAILED
+                )
+                task.error = report.longreprtext
+                task.violations = getattr(report, 'violations', None)
+            elif report.outcome == 'skipped' and report.when == 'setup':
+                task.status = TaskStatus.SKIPPED
     return None
+
+
+def pytest_collectreport(report):
+    """
+    Fail the tasks in the running session whose test module could not be collected
+    with the reason it could not be.
+    """
+    if not report.failed:
+        return
+    module = Path(report.nodeid).stem
+    for (test_module, _), tasks in running_tasks.items():
+        if test_module == module:
+            for task in tasks:
+                task.status = TaskStatus.ERROR
+                task.error = report.longreprtext
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """
+    Measure the memory used by the test and record it on the profiles of the tasks
+    it belongs to.
+    """
+    test_file, _, test_func = item.nodeid.rpartition('::')
+    tasks = running_tasks.get((Path(test_file).stem, test_func), [])
+    if not tasks:
+        yield
+        return
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    peak_rss(reset=True)
+    try:
+        yield
+    finally:
+        rss = peak_rss()
+        current, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        for task in tasks:
+            if task.profile:
+                task.profile.peak_rss = rss
+                task.profile.allocated = max(current - start, 0)
+                task.profile.allocated_peak = max(peak - start, 0)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """
+    Mark the reports of tests that failed only because the task code was too slow,
+    and attach the requirements the task code did not meet to the reports of tests
+    that failed because of them.
+    """
+    from learn_python.tests.performance import TooSlow
+    from learn_python.tests.rules import RequirementsNotMet
+    outcome = yield
+    if call.excinfo is not None and call.excinfo.errisinstance(TooSlow):
+        outcome.get_result().too_slow = True
+    elif call.excinfo is not None and call.excinfo.errisinstance(RequirementsNotMet):
+        outcome.get_result().violations = call.excinfo.value.violations
@@ -0,0 +1,47 @@
+"""
+Tests of the grading machinery itself, rather than of the course tasks.
+"""
+import sys
+import pytest
+from learn_python import register
+from learn_python.tests.tasks import Task, TaskStatus, run_sessions
+
+
+# the tests the tasks below are graded by
+
+def test_session_output_first():
+    print('first stdout')
+    print('first stderr', file=sys.stderr)
+
+
+def test_session_output_second():
+    print('second stdout')
+
+
+@pytest.fixture
+def session_tasks(monkeypatch):
+    # the sessions below must not post the course logs when they finish
+    monkeypatch.setattr(register, '_report_lock', True)
+    return [
+        Task(
+            number=number,
+            name=f'session_output_{name}',
+            path=__file__,
+            test=f'learn_python.tests.test_tasks.test_session_output_{name}',
+            module='grading'
+        ) for number, name in enumerate(['first', 'second'])
+    ]
+
+
+def test_run_sessions_output_per_task(session_tasks):
+    first, second = session_tasks
+    run_sessions(session_tasks)
+
+    assert first.status is TaskStatus.PASSED
+    assert second.status is TaskStatus.PASSED
+    assert 'first stdout' in first.output and 'first stderr' in first.output
+    assert 'second' not in first.output
+    assert 'second stdout' in second.output
+    assert 'first' not in second.output
+    for task in session_tasks:
+        assert task.profile is not None and task.profile.call > 0
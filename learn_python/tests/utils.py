@@ -1,8 +1,12 @@
 import importlib
 import inspect
 import ast
+import os
 from math import isclose
 from functools import wraps
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Set, Optional
 
 
 def import_string(str_to_import):
@@ -12,17 +16,108 @@ def import_string(str_to_import):
 
 
 
+class SourceIndex:
+    """
+    Everything the structural checks below need to know about a function's source,
+    gathered in a single pass over its syntax tree. Get these with source_index(),
+    which caches them.
+
+    :param tree: The parsed source, a Module holding the function definition
+    """
+
+    tree: ast.Module
+
+    # node type -> number of nodes of exactly that type
+    node_counts: Counter
+
+    # name -> number of calls to that name, including method calls: x.name()
+    call_names: Counter
+
+    # name -> number of calls to that plain name: name()
+    function_call_names: Counter
+
+    # the total number of calls
+    calls: int
+
+    # the types of the operators used in boolean operations (and/or)
+    bool_ops: Set[type]
+
+    # the total number of statements, including the definition itself
+    statements: int
+
+    # the text of the first format specifier in an f-string, if any
+    format_spec: Optional[str] = None
+
+    def __init__(self, tree: ast.Module):
+        self.tree = tree
+        self.node_counts = Counter()
+        self.call_names = Counter()
+        self.function_call_names = Counter()
+        self.calls = 0
+        self.bool_ops = set()
+        self.statements = 0
+        for node in ast.walk(tree):
+            self.node_counts[type(node)] += 1
+            if isinstance(node, ast.stmt):
+                self.statements += 1
+            if isinstance(node, ast.Call):
+                self.calls += 1
+                if isinstance(node.func, ast.Name):
+                    self.call_names[node.func.id] += 1
+                    self.function_call_names[node.func.id] += 1
+                elif isinstance(node.func, ast.Attribute):
+                    self.call_names[node.func.attr] += 1
+            elif isinstance(node, ast.BoolOp):
+                self.bool_ops.add(type(node.op))
+            elif (
+                self.format_spec is None and
+                isinstance(node, ast.FormattedValue) and
+                node.format_spec is not None
+            ):
+                self.format_spec = node.format_spec.values[0].value
+
+    def count(self, node_type) -> int:
+        """The number of nodes of the given type, or any of its subclasses."""
+        return sum(
+            count for typ, count in self.node_counts.items() if issubclass(typ, node_type)
+        )
+
+    @property
+    def definition(self) -> Optional[ast.AST]:
+        return self.tree.body[0] if self.tree.body else None
+
+
+# (source file, qualified name, first line) -> (file modification time, SourceIndex)
+_source_indexes: Dict[tuple, tuple] = {}
+
+
+def source_index(func) -> SourceIndex:
+    """
+    Get the SourceIndex for the given function. Indexes are cached until the file
+    the function is defined in changes. Syntax trees are indexed every time.
+    """
+    if isinstance(func, SourceIndex):
+        return func
+    if isinstance(func, ast.AST):
+        return SourceIndex(func)
+    try:
+        source_file = inspect.getsourcefile(func)
+        key = (source_file, func.__qualname__, func.__code__.co_firstlineno)
+        mtime = os.stat(source_file).st_mtime
+    except (TypeError, AttributeError, OSError):
+        return SourceIndex(ast.parse(inspect.getsource(func)))
+    cached = _source_indexes.get(key, None)
+    if cached is None or cached[0] != mtime:
+        cached = _source_indexes[key] = (mtime, SourceIndex(ast.parse(inspect.getsource(func))))
+    return cached[1]
+
+
 def is_function_called(calling_func, called_func):
     """
     Check if the calling_func calls the called_func.
     """
     called_name = called_func if isinstance(called_func, str) else called_func.__name__
-    for node in ast.walk(parse_ast(calling_func)):
-        if isinstance(node, ast.Call):
-            func_name = node.func.id if isinstance(node.func, ast.Name) else node.func.attr
-            if func_name == called_name:
-                return True
-    return False
+    return called_name in source_index(calling_func).call_names
 
 
 def count_calls(calling_func, called_func = None):
@@ -33,31 +128,20 @@ def count_calls(calling_func, called_func = None):
     :param called_func: str or function - the function to count calls to,
         if None count all calls
     """
-    calls = 0
-    for node in ast.walk(parse_ast(calling_func)):
-        if isinstance(node, ast.Call):
-            if (
-                called_func is None or 
-                (isinstance(called_func, str) and called_func == node.func.id) or
-                called_func.__name__ == node.func.id
-            ):
-                calls += 1
-    return calls
+    index = source_index(calling_func)
+    if called_func is None:
+        return index.calls
+    called_name = called_func if isinstance(called_func, str) else called_func.__name__
+    return index.function_call_names[called_name]
 
 
 def parse_ast(func):
-    if not isinstance(func, ast.AST):
-        return ast.parse(inspect.getsource(func))
-    return func
+    return source_index(func).tree
 
 
 def has_docstring(func):
-    parsed_ast = parse_ast(func)
-    if is_function(parsed_ast) or is_class(parsed_ast):
-        node = parsed_ast.body[0]
-    elif parsed_ast.body:
-        node = parsed_ast.body[0]
-    else:
+    node = source_index(func).definition
+    if node is None:
         return False
     return (
         isinstance(node.body[0], ast.Expr) and 
@@ -66,35 +150,26 @@ def has_docstring(func):
 
 
 def is_class(func):
-    tree = parse_ast(func)
-    return tree.body and isinstance(parse_ast(func).body[0], ast.ClassDef)
+    return isinstance(source_index(func).definition, ast.ClassDef)
 
 
 def is_function(func):
-    tree = parse_ast(func)
-    return tree.body and isinstance(parse_ast(func).body[0], ast.FunctionDef)
+    return isinstance(source_index(func).definition, ast.FunctionDef)
 
 
 def num_statements(func):
-    tree = parse_ast(func)
-    return sum(
-        1 for child in ast.walk(tree) if isinstance(child, ast.stmt)
-    ) - 1 if is_function(tree) or is_class(tree) else 0
+    index = source_index(func)
+    return index.statements - 1 if isinstance(
+        index.definition, (ast.FunctionDef, ast.ClassDef)
+    ) else 0
 
 
 def count_statements(func, statement):
-    statements = 0
-    for node in ast.walk(parse_ast(func)):
-        if isinstance(node, statement):
-            statements += 1
-    return statements
+    return source_index(func).count(statement)
 
 
 def has_statement(func, statement):
-    for node in ast.walk(parse_ast(func)):
-        if isinstance(node, statement):
-            return True
-    return False
+    return count_statements(func, statement) > 0
 
 
 def has_ternary(func):
@@ -118,39 +193,23 @@ def has_pass(func):
 
 
 def has_and(func):
-    for node in ast.walk(parse_ast(func)):
-        if isinstance(node, ast.BoolOp):
-            if isinstance(node.op, ast.And):
-                return True
-    return False
+    return ast.And in source_index(func).bool_ops
 
 
 def has_or(func):
-    for node in ast.walk(parse_ast(func)):
-        if isinstance(node, ast.BoolOp):
-            if isinstance(node.op, ast.Or):
-                return True
-    return False
+    return ast.Or in source_index(func).bool_ops
 
 
 def has_not(func):
-    for node in ast.walk(parse_ast(func)):
-        if isinstance(node, ast.BoolOp):
-            if isinstance(node.op, ast.Not):
-                return True
-    return False
+    return ast.Not in source_index(func).bool_ops
 
 
 def has_logical_operator(func):
-    tree = parse_ast(func)
-    return has_and(tree) or has_or(tree) or has_not(tree)
+    return bool(source_index(func).bool_ops)
 
 
 def has_format_specifier(func):
-    for node in ast.walk(parse_ast(func)):
-        if isinstance(node, ast.FormattedValue) and node.format_spec is not None:
-            return node.format_spec.values[0].value
-    return False
+    return source_index(func).format_spec or False
 
 
 def has_while_loop(func):
@@ -182,12 +241,64 @@ def is_unimplemented(func):
     A function is considered unimplemented if it has only a doctstring, only a pass
     or only a docstring and a pass statement.
     """
-    tree = parse_ast(func)
+    index = source_index(func)
     return (
-        (num_statements(tree) == 1 and (has_pass(tree) or has_docstring(tree))) or
-        (num_statements(tree) == 2 and has_docstring(tree) and has_pass(tree))
+        (num_statements(index) == 1 and (has_pass(index) or has_docstring(index))) or
+        (num_statements(index) == 2 and has_docstring(index) and has_pass(index))
     )
 
+
+# source file -> (file modification time, {function name: unimplemented})
+_implementation_scans: Dict[str, tuple] = {}
+
+
+def scan_unimplemented(path, mtime=None) -> Optional[Dict[str, bool]]:
+    """
+    Find which of the functions defined at the top level of a source file are
+    unimplemented, see is_unimplemented(), without importing it. The file is parsed
+    once and the results are cached until it changes.
+
+    :param path: The source file
+    :param mtime: The file's modification time, if the caller has already stat'ed it
+    :return: A dictionary mapping the name of each function to True if it is
+        unimplemented, or None if the file cannot be parsed
+    """
+    path = str(path)
+    if mtime is None:
+        mtime = os.stat(path).st_mtime
+    cached = _implementation_scans.get(path, None)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path, encoding='utf-8') as source:
+                tree = ast.parse(source.read(), filename=path)
+            functions = {
+                node.name: is_unimplemented(
+                    ast.Module(body=[node], type_ignores=[])
+                )
+                for node in tree.body if isinstance(node, ast.FunctionDef)
+            }
+        except (SyntaxError, ValueError):
+            functions = None
+        cached = _implementation_scans[path] = (mtime, functions)
+    return cached[1]
+
+
+def scan_unimplemented_directory(directory, pattern='*.py') -> Dict[Path, Optional[Dict[str, bool]]]:
+    """
+    Scan every source file in the directory matching the pattern, in a single pass
+    over the directory. See scan_unimplemented()
+
+    :return: A dictionary mapping each file's path to its scan results
+    """
+    results = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and Path(entry.name).match(pattern):
+                results[Path(entry.path)] = scan_unimplemented(
+                    entry.path, mtime=entry.stat().st_mtime
+                )
+    return results
+
 def compare_floats(list1, list2, tolerance=1e-9):
     if len(list1) == len(list2):
         for a, b in zip(list1, list2):
@@ -0,0 +1,275 @@
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import typer
+import logging
+from pathlib import Path
+from typing import Annotated, Dict, List, Set, Tuple, Iterable
+from termcolor import colored
+from learn_python import main
+from learn_python.utils import ConeOfSilence, configure_logging, lp_logger
+from learn_python.tests.tasks import Task, TaskStatus, run_tasks
+
+
+# editors often write a file in several steps - wait this long after the first
+# change for the rest of them before grading
+DEBOUNCE_SECONDS = 0.05
+
+STATUS_COLORS = {
+    TaskStatus.NOT_RUN: 'white',
+    TaskStatus.PASSED: 'green',
+    TaskStatus.SKIPPED: 'yellow',
+    TaskStatus.FAILED: 'red',
+    TaskStatus.ERROR: 'red',
+    TaskStatus.RELOAD_ERROR: 'red',
+    TaskStatus.TOO_SLOW: 'magenta'
+}
+
+
+class InotifyWatcher:
+    """
+    Watch directories for file changes using the Linux inotify api.
+
+    :param directories: The directories to watch
+    :raises OSError: if inotify is not available on this system
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, directories: Iterable[Path]):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError) as err:
+            raise OSError('inotify is not available on this system.') from err
+
+        self.fd = inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'Unable to initialize inotify.')
+
+        self.watches = {}
+        mask = (
+            self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO |
+            self.IN_CREATE | self.IN_DELETE
+        )
+        for directory in directories:
+            wd = inotify_add_watch(self.fd, str(directory).encode(), mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f'Unable to watch {directory}.')
+            self.watches[wd] = Path(directory)
+
+    def changes(self, timeout=None) -> Set[Path]:
+        """
+        Wait for files to change.
+
+        :param timeout: The maximum number of seconds to wait, None waits forever
+        :return: The set of files that changed, empty if none changed before the timeout
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode()
+            offset += length
+            if name and wd in self.watches:
+                changed.add(self.watches[wd] / name)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Watch directories for file changes by polling the modification times of the
+    python files in them. Used where inotify is not available.
+
+    :param directories: The directories to watch
+    :param interval: The number of seconds between polls
+    """
+
+    def __init__(self, directories: Iterable[Path], interval: float = 0.25):
+        self.directories = list(directories)
+        self.interval = interval
+        self.mtimes = self.scan()
+
+    def scan(self) -> Dict[Path, float]:
+        mtimes = {}
+        for directory in self.directories:
+            for path in directory.glob('*.py'):
+                try:
+                    mtimes[path] = path.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+        return mtimes
+
+    def changes(self, timeout=None) -> Set[Path]:
+        """
+        Wait for files to change.
+
+        :param timeout: The maximum number of seconds to wait, None waits forever
+        :return: The set of files that changed, empty if none changed before the timeout
+        """
+        start = time.monotonic()
+        while True:
+            mtimes = self.scan()
+            changed = {
+                path for path in set(mtimes) | set(self.mtimes)
+                if mtimes.get(path, None) != self.mtimes.get(path, None)
+            }
+            self.mtimes = mtimes
+            if changed or (timeout is not None and time.monotonic() - start >= timeout):
+                return changed
+            time.sleep(
+                self.interval if timeout is None else
+                max(0, min(self.interval, timeout - (time.monotonic() - start)))
+            )
+
+    def close(self):
+        pass
+
+
+def get_watcher(directories: Iterable[Path], poll: bool = False, interval: float = 0.25):
+    """Get an inotify watcher if we can, fall back to polling if we can't."""
+    directories = [directory for directory in directories if directory.is_dir()]
+    if not poll:
+        try:
+            return InotifyWatcher(directories)
+        except OSError:
+            lp_logger.info('inotify unavailable, polling for changes instead.')
+    return PollingWatcher(directories, interval=interval)
+
+
+def get_dependents() -> Dict[Tuple[str, str], Set[Tuple[str, str]]]:
+    """
+    Get a mapping from each task to the tasks that depend on it, as declared by the
+    dependencies in the task documentation. See AssignmentDocs.dependencies
+    """
+    from learn_python.doc import task_map
+    dependents = {}
+    try:
+        with ConeOfSilence():  # this might trigger a doc parse which is very chatty!
+            task_sections = task_map().task_sections
+    except Exception:
+        lp_logger.exception('Unable to read task dependencies from the documentation.')
+        return dependents
+    for module, task_docs in task_sections.items():
+        for task_name, docs in task_docs.items():
+            for dependency in docs.dependencies:
+                dependents.setdefault(dependency, set()).add((module, task_name))
+    return dependents
+
+
+def affected_tasks(
+    changed: Iterable[Path],
+    tasks: Dict[str, Dict[str, Task]],
+    dependents: Dict[Tuple[str, str], Set[Tuple[str, str]]]
+) -> List[Task]:
+    """
+    Get the tasks whose source changed and all of the tasks that depend on them,
+    in course order.
+    """
+    changed = {Path(path).resolve() for path in changed}
+    to_visit = [
+        (module, task.name)
+        for module, mod_tasks in tasks.items()
+        for task in mod_tasks.values()
+        if Path(task.path).resolve() in changed
+    ]
+    affected = set()
+    while to_visit:
+        key = to_visit.pop()
+        if key not in affected and key[0] in tasks and key[1] in tasks[key[0]]:
+            affected.add(key)
+            to_visit.extend(dependents.get(key, []))
+    return [
+        task
+        for module, mod_tasks in tasks.items()
+        for task in mod_tasks.values()
+        if (module, task.name) in affected
+    ]
+
+
+def print_results(results: Iterable[Task]):
+    for task in results:
+        print(colored(
+            f'[{task.status.name}] {task.module}::{task.name}',
+            STATUS_COLORS.get(task.status, 'white')
+        ))
+        if task.error_msg:
+            print(colored(f'    {task.error_msg}', 'red'))
+
+
+@main(catch=False)
+def watch(
+    poll: Annotated[
+        bool,
+        typer.Option(
+            '--poll',
+            help='Poll for file changes instead of using inotify.'
+        )
+    ] = False,
+    interval: Annotated[
+        float,
+        typer.Option(
+            '--interval',
+            help='The number of seconds between polls, if polling.'
+        )
+    ] = 0.25
+):
+    """
+    Watch your gateway tasks and re-run their tests every time you save them.
+    Tasks that depend on a changed task are re-run as well.
+    """
+    from learn_python.register import do_report, lock_reporting
+    from learn_python.tests.tests import tasks
+    lock_reporting()
+    configure_logging()
+    logging.getLogger('testing').info('[START] watch')
+    dependents = get_dependents()
+    watcher = get_watcher(
+        {Path(task.path).parent for mod_tasks in tasks.values() for task in mod_tasks.values()},
+        poll=poll,
+        interval=interval
+    )
+    try:
+        print_results(
+            task for task in run_tasks(
+                task for mod_tasks in tasks.values() for task in mod_tasks.values()
+            ) if task.status is not TaskStatus.SKIPPED
+        )
+        print(colored('Watching for changes... (ctrl-C to stop)', 'blue'))
+        while True:
+            changed = watcher.changes()
+            changed |= watcher.changes(timeout=DEBOUNCE_SECONDS)
+            affected = affected_tasks(changed, tasks, dependents)
+            if affected:
+                start = time.perf_counter()
+                print_results(run_tasks(affected, force=True))
+                print(colored(f'({time.perf_counter() - start:.2f}s)', 'blue'))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        logging.getLogger('testing').info('[STOP] watch')
+        lock_reporting(False)
+        do_report()
+
+
+(watch_app := typer.Typer(add_completion=False)).command()(watch.__closure__[-1].cell_contents)